@@ -1,25 +1,56 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import json
 from app.config import settings
-from app.vectorstore import as_retriever
 from app.rag.prompts import build_prompt
 from app.rag.answer import answer_from_context
+from app.rag.coalesce import coalesced_chat_events, coalesced_retrieve
+from app.rag.generate import with_scores
+from app.tenancy import normalize_tenant
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
 class ChatRequest(BaseModel):
     question: str
     backend: Optional[str] = "chroma"
+    # stream=true answers with Server-Sent Events instead of a single JSON body
+    stream: bool = False
+    tenant: Optional[str] = None
+
+
+async def _sse_events(question: str, backend: str, tenant: Optional[str] = None):
+    async for event in coalesced_chat_events(question, backend, tenant=tenant):
+        # events are shared with other coalesced requests; don't mutate them
+        data = {k: v for k, v in event.items() if k != "type"}
+        yield f"event: {event['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(question: str, backend: str, tenant: Optional[str] = None) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_events(question, backend, tenant),
+        media_type="text/event-stream",
+        # keep reverse proxies (nginx etc.) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.post("/chat")
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
     backend = req.backend or "chroma"
+    if backend not in ("chroma", "weaviate"):
+        backend = "chroma"
     if not req.question or not req.question.strip():
         return {"error": "Question must not be empty."}
-    retriever = as_retriever(k=settings.top_k, backend=backend)
-    docs = retriever.get_relevant_documents(req.question.strip())
+    try:
+        tenant = normalize_tenant(req.tenant)
+    except ValueError as e:
+        return {"error": str(e)}
+    if req.stream:
+        return sse_response(req.question.strip(), backend, tenant)
+    scored = await coalesced_retrieve(req.question.strip(), backend, settings.top_k, tenant)
+    docs = [d for d, _ in scored]
     prompt, sources = build_prompt(req.question.strip(), docs)
     answer = answer_from_context(req.question.strip(), docs)
-    return {"answer": answer, "sources": sources, "backend": backend, "top_k": settings.top_k}
-
+    return {"answer": answer, "sources": with_scores(sources, scored), "backend": backend, "top_k": settings.top_k, "tenant": tenant}
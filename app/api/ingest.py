@@ -3,18 +3,27 @@ from pydantic import BaseModel
 from typing import Optional
 from app.vectorstore import reset_vectorstore, get_vectorstore
 from app.rag.index import ingest_all
+from app.tenancy import normalize_tenant, tenant_scope
 
 router = APIRouter(prefix="/api", tags=["ingest"])
 
 class IngestRequest(BaseModel):
     force_reset: bool = False
     backend: Optional[str] = "chroma"
+    tenant: Optional[str] = None
 
 @router.post("/ingest")
 def ingest(req: IngestRequest):
     backend = req.backend or "chroma"
-    if req.force_reset:
-        reset_vectorstore(backend=backend)
-        get_vectorstore(backend=backend)
-    return ingest_all(backend=backend)
+    try:
+        tenant = normalize_tenant(req.tenant)
+    except ValueError as e:
+        return {"error": str(e)}
+    with tenant_scope(tenant):
+        if req.force_reset and backend != "chroma":
+            reset_vectorstore(backend=backend)
+            get_vectorstore(backend=backend)
+        summary = ingest_all(backend=backend, force_reset=req.force_reset)
+    summary["tenant"] = tenant
+    return summary
 
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+from app.config import settings
+from app.rag.shadow import get_shadow_index
+from app.tenancy import normalize_tenant, tenant_scope
+from app.vectorstore import chroma_lease
+
+router = APIRouter(prefix="/api", tags=["shadow"])
+
+# the exact baseline holds a sample x collection distance matrix, so keep the sample small
+_MAX_SAMPLE = 200
+
+
+@router.get("/shadow-index")
+def shadow_index_report(
+    k: Optional[int] = Query(None, ge=1, le=100),
+    sample: int = Query(50, ge=1, le=_MAX_SAMPLE),
+    tenant: Optional[str] = None,
+):
+    mode = (settings.shadow_index or "").lower()
+    if mode not in ("int8", "binary"):
+        return {"enabled": False}
+    try:
+        tenant = normalize_tenant(tenant)
+    except ValueError as e:
+        return {"error": str(e)}
+    with tenant_scope(tenant), chroma_lease():
+        index = get_shadow_index()
+        if index is None:
+            return {"enabled": True, "tenant": tenant, "loaded": False, "error": "No vector file for the live index; re-ingest to build it."}
+        return {"enabled": True, "tenant": tenant, "loaded": True, "memory": index.memory(), "recall": index.recall_report(k=k, sample=sample)}
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, Form
 from fastapi import HTTPException
-from typing import List
+from typing import List, Optional
 import os
-from app.config import settings
+from app.tenancy import normalize_tenant, tenant_pdfs_dir
 
 router = APIRouter(tags=["upload"])
 
@@ -28,11 +28,15 @@ def _sanitize_filename(name: str) -> str:
 
 
 @router.post("/upload-pdfs")
-async def upload_pdfs(files: List[UploadFile] = File(...)):
+async def upload_pdfs(files: List[UploadFile] = File(...), tenant: Optional[str] = Form(None)):
     if not files:
         raise HTTPException(status_code=400, detail="No files provided.")
+    try:
+        tenant = normalize_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    dest_dir = os.path.abspath(settings.pdfs_dir)
+    dest_dir = os.path.abspath(tenant_pdfs_dir(tenant))
     _ensure_dir(dest_dir)
 
     saved = []
@@ -68,4 +72,5 @@ async def upload_pdfs(files: List[UploadFile] = File(...)):
         "saved": saved,
         "skipped": skipped,
         "pdfs_dir": dest_dir,
+        "tenant": tenant,
     }
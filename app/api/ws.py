@@ -1,56 +1,75 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Any, AsyncIterator, Dict, List, Optional
 from app.config import settings
-from app.vectorstore import as_retriever
-from app.rag.prompts import SYSTEM_INSTRUCTIONS
-from typing import List
+from app.rag.coalesce import coalesced_chat_events
+from app.tenancy import normalize_tenant
 import asyncio
+import contextlib
 
 router = APIRouter(tags=["ws"])
 
-# LLM clients
-from openai import OpenAI
-import google.generativeai as genai
+# Frame formats, chosen per message with "format":
+#   raw  (default) - answer text as plain text frames; sources/done/no_context/error as JSON
+#   json - every frame is a JSON event: {"type":"token","text":...} batches, then citations, done
+_FORMATS = ("raw", "json")
 
 
-def _format_context(docs) -> str:
-    lines: List[str] = []
-    for i, d in enumerate(docs, start=1):
-        md = getattr(d, "metadata", {}) or {}
-        file = md.get("file") or md.get("source") or "unknown"
-        page = md.get("page")
-        page_str = str(page) if page is not None else "?"
-        content = d.page_content or ""
-        lines.append(f"[{i}] ({file} p.{page_str})\n{content}")
-    return "\n\n".join(lines)
-
-
-def _build_system_prompt() -> str:
-    # Strengthen grounding rules
-    return (
-        SYSTEM_INSTRUCTIONS
-        + "\n\nRules: Answer ONLY using the provided context snippets. Do not invent details. "
-        + "If the answer cannot be derived from the context, respond: 'I don't have enough information.' "
-        + "Prefer quoting or paraphrasing the relevant lines. Be concise."
-    )
-
-
-def _build_user_prompt(question: str, docs) -> str:
-    ctx = _format_context(docs)
-    return (
-        "Use only the following context to answer the user's question. If the answer is not found, say you do not have enough information.\n\n"
-        f"Context:\n{ctx}\n\nQuestion:\n{question}"
-    )
-
-
-def _citations_text(docs) -> str:
-    lines: List[str] = ["\n\nCitations:"]
-    for i, d in enumerate(docs, start=1):
-        md = getattr(d, "metadata", {}) or {}
-        file = md.get("file") or md.get("source") or "unknown"
-        page = md.get("page")
-        page_str = str(page) if page is not None else "?"
-        lines.append(f"[{i}] {file} p.{page_str}")
-    return "\n".join(lines)
+async def batched_tokens(
+    events: AsyncIterator[Dict[str, Any]],
+    max_bytes: int,
+    window: float,
+) -> AsyncIterator[Dict[str, Any]]:
+    # Merge consecutive token events into one, flushed once max_bytes are buffered or window
+    # seconds after the first buffered token; any other event flushes the buffer first.
+    if max_bytes <= 0 and window <= 0:
+        async for event in events:
+            yield event
+        return
+    loop = asyncio.get_running_loop()
+    it = events.__aiter__()
+    buf: List[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                # the read stays pending across a time flush, so the source is never cancelled mid-step
+                pending = asyncio.ensure_future(it.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield {"type": "token", "text": "".join(buf)}
+                buf, size, deadline = [], 0, None
+                continue
+            fut, pending = pending, None
+            try:
+                event = fut.result()
+            except StopAsyncIteration:
+                break
+            if event["type"] == "token":
+                if not buf:
+                    deadline = loop.time() + max(0.0, window)
+                buf.append(event["text"])
+                size += len(event["text"].encode("utf-8"))
+                if max_bytes > 0 and size >= max_bytes:
+                    yield {"type": "token", "text": "".join(buf)}
+                    buf, size, deadline = [], 0, None
+                continue
+            if buf:
+                yield {"type": "token", "text": "".join(buf)}
+                buf, size, deadline = [], 0, None
+            yield event
+        if buf:
+            yield {"type": "token", "text": "".join(buf)}
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await pending
+        aclose = getattr(it, "aclose", None)
+        if aclose is not None:
+            await aclose()
 
 
 @router.websocket("/ws/chat")
@@ -60,74 +79,40 @@ async def chat_ws(ws: WebSocket):
         msg = await ws.receive_json()
         question = (msg.get("question") or "").strip()
         backend = (msg.get("backend") or "chroma").lower()
+        fmt = (msg.get("format") or "raw").lower()
         if not question:
             await ws.send_json({"error": "Question must not be empty."})
             await ws.close()
             return
-        retriever = as_retriever(k=settings.top_k, backend=backend)
-        docs = retriever.get_relevant_documents(question)
-        # Strict grounding: if no docs, immediately refuse
-        if not docs:
-            await ws.send_json({"answer": "I don't have enough information to answer that.", "sources": []})
+        if fmt not in _FORMATS:
+            await ws.send_json({"error": f"Unknown format: {fmt} (use raw or json)."})
             await ws.close()
             return
-        system_prompt = _build_system_prompt()
-        user_prompt = _build_user_prompt(question, docs)
-
-        # Send sources first
-        sources = []
-        for i, d in enumerate(docs, start=1):
-            md = getattr(d, "metadata", {}) or {}
-            file = md.get("file") or md.get("source") or "unknown"
-            page = md.get("page")
-            sources.append({"file": file, "page": page})
-        await ws.send_json({"type": "sources", "sources": sources, "backend": backend, "top_k": settings.top_k})
-
-        provider = (settings.embeddings_provider or "openai").lower()
-        if provider == "gemini":
-            if not settings.gemini_api_key:
-                await ws.send_json({"error": "GEMINI_API_KEY not configured."})
-                await ws.close()
-                return
-            genai.configure(api_key=settings.gemini_api_key)
-            gem_model = settings.gemini_chat_model or "gemini-2.5-flash"
-            if gem_model.startswith("models/"):
-                gem_model = gem_model.split("/", 1)[1]
-            model = genai.GenerativeModel(model_name=gem_model, system_instruction=system_prompt)
-            try:
-                response = model.generate_content(user_prompt, stream=True)
-                for chunk in response:
-                    txt = getattr(chunk, "text", None)
-                    if txt:
-                        await ws.send_text(txt)
-                    await asyncio.sleep(0)
-            except Exception as e:
-                await ws.send_json({"error": str(e)})
-                await ws.close()
-                return
-        else:
-            if not settings.openai_api_key:
-                await ws.send_json({"error": "OPENAI_API_KEY not configured."})
-                await ws.close()
-                return
-            client = OpenAI(api_key=settings.openai_api_key)
-            stream = client.chat.completions.create(
-                model=settings.openai_chat_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                stream=True,
-            )
-            for chunk in stream:
-                delta = chunk.choices[0].delta.content
-                if delta:
-                    await ws.send_text(delta)
-                await asyncio.sleep(0)
-
-        # Append citations at the end of the streamed output
-        await ws.send_text(_citations_text(docs))
-        await ws.send_json({"type": "done"})
+        try:
+            tenant = normalize_tenant(msg.get("tenant"))
+        except ValueError as e:
+            await ws.send_json({"error": str(e)})
+            await ws.close()
+            return
+        events = batched_tokens(
+            coalesced_chat_events(question, backend, tenant=tenant),
+            settings.ws_flush_bytes,
+            settings.ws_flush_ms / 1000,
+        )
+        # closed on disconnect too, so a shared stream notices the subscriber is gone right away
+        async with contextlib.aclosing(events):
+            async for event in events:
+                kind = event["type"]
+                if fmt == "json":
+                    await ws.send_json(event)
+                elif kind == "token" or kind == "citations":
+                    await ws.send_text(event["text"])
+                elif kind == "no_context":
+                    await ws.send_json({"answer": event["answer"], "sources": event["sources"]})
+                elif kind == "error":
+                    await ws.send_json({"error": event["error"]})
+                else:
+                    await ws.send_json(event)
         await ws.close()
     except WebSocketDisconnect:
         return
@@ -1,5 +1,5 @@
 from typing import Dict, Any
-from app.vectorstore import as_retriever
+from app.vectorstore import as_retriever, chroma_lease
 from app.prompts import build_prompt, SYSTEM_INSTRUCTIONS
 
 # For demo, we won't call an LLM for generation; we'll synthesize from retrieved context.
@@ -23,8 +23,9 @@ def answer_from_context(question: str, context_docs):
 
 
 def chat_query(question: str, top_k: int) -> Dict[str, Any]:
-    retriever = as_retriever(k=top_k)
-    docs = retriever.get_relevant_documents(question)
+    with chroma_lease():
+        retriever = as_retriever(k=top_k)
+        docs = retriever.get_relevant_documents(question)
     prompt, sources = build_prompt(question, docs)
     # generate answer grounded in retrieved docs
     answer = answer_from_context(question, docs)
@@ -1,18 +1,28 @@
 import os
-from pydantic import Field
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class Settings(BaseSettings):
-    # Embeddings provider: 'openai' (default), 'ollama', or 'gemini'
+    # Embeddings provider: 'openai' (default), 'ollama', 'gemini', 'onnx' (local CPU) or 'hash' (deterministic, offline)
     embeddings_provider: str = Field(default=os.getenv("EMBEDDINGS_PROVIDER", "openai"))
+    hash_embed_dim: int = Field(default=int(os.getenv("HASH_EMBED_DIM", "1024")))
+
+    # ONNX Runtime embeddings (in-process); empty dir = Chroma's all-MiniLM-L6-v2, downloaded on first use
+    onnx_model_dir: str = Field(default=os.getenv("ONNX_MODEL_DIR", ""))
+    onnx_threads: int = Field(default=int(os.getenv("ONNX_THREADS", "0")))
+    onnx_batch_size: int = Field(default=int(os.getenv("ONNX_BATCH_SIZE", "32")))
+    onnx_max_length: int = Field(default=int(os.getenv("ONNX_MAX_LENGTH", "256")))
+    onnx_token_cache: int = Field(default=int(os.getenv("ONNX_TOKEN_CACHE", "4096")))
 
     # OpenAI embeddings + chat
     openai_api_key: str = Field(default=os.getenv("OPENAI_API_KEY", ""))
     openai_embed_model: str = Field(default=os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small"))
     openai_chat_model: str = Field(default=os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"))
+    # OpenAI-compatible chat endpoint (proxy, self-hosted model, or the load test's fake server)
+    openai_base_url: str = Field(default=os.getenv("OPENAI_BASE_URL", ""))
 
     # Ollama embeddings (local)
     ollama_host: str = Field(default=os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434"))
@@ -27,10 +37,61 @@ class Settings(BaseSettings):
     # Optional Chroma API key (for remote Chroma deployments)
     chroma_api_key: str = Field(default=os.getenv("CHROMA_API_KEY", ""))
     chroma_persist_dir: str = Field(default=os.getenv("CHROMA_PERSIST_DIR", "data/chroma"))
+    # Number of index versions kept on disk (live + previous) for readers mid-switch
+    chroma_keep_versions: int = Field(default=int(os.getenv("CHROMA_KEEP_VERSIONS", "2")))
+    # Seconds a replaced version stays on disk before GC may delete it (other workers may be mid-query)
+    chroma_gc_grace_s: int = Field(default=int(os.getenv("CHROMA_GC_GRACE_S", "300")))
+    # >1 partitions new Chroma indexes across this many collections (by file), written in parallel
+    chroma_shards: int = Field(default=int(os.getenv("CHROMA_SHARDS", "1")))
+    # threads for shard writes during ingest and, with more than one CPU, per-shard searches (0 = Python's default pool size)
+    chroma_shard_workers: int = Field(default=int(os.getenv("CHROMA_SHARD_WORKERS", "0")))
     pdfs_dir: str = Field(default=os.getenv("PDFS_DIR", "data/pdfs"))
+    # Multi-tenant namespaces: non-default tenants keep PDFs and Chroma data under TENANTS_DIR/<tenant>/.
+    # Open tenant stores are LRU-evicted beyond TENANT_CACHE_MAX or an estimated TENANT_CACHE_MB.
+    tenants_dir: str = Field(default=os.getenv("TENANTS_DIR", "data/tenants"))
+    tenant_cache_max: int = Field(default=int(os.getenv("TENANT_CACHE_MAX", "16")))
+    tenant_cache_mb: int = Field(default=int(os.getenv("TENANT_CACHE_MB", "1024")))
     chunk_size: int = Field(default=int(os.getenv("CHUNK_SIZE", "1000")))
     chunk_overlap: int = Field(default=int(os.getenv("CHUNK_OVERLAP", "200")))
     top_k: int = Field(default=int(os.getenv("TOP_K", "4")))
+    # Chat drops retrieved chunks scoring below the threshold, or more than MAX_GAP below the best one,
+    # and skips the LLM when none are left. Relevance is on Chroma's l2 scale (0.0 ~ cosine 0.3 for
+    # unit-length embeddings; Weaviate dot products are mapped onto it); empty disables either cutoff.
+    # The threshold is off by default: for embeddings that are not unit length (e.g. Ollama's
+    # nomic-embed-text) l2 relevance is mostly negative and any fixed value would reject everything.
+    relevance_threshold: float = Field(default=os.getenv("RELEVANCE_THRESHOLD", ""), validate_default=True)
+    relevance_max_gap: float = Field(default=os.getenv("RELEVANCE_MAX_GAP", "0.2"), validate_default=True)
+    # Chroma retrieval: 'flat' (all chunks) or 'hierarchical' (rank PDF sections first, then chunks within them)
+    retrieval_mode: str = Field(default=os.getenv("RETRIEVAL_MODE", "flat"))
+    hierarchy_top_docs: int = Field(default=int(os.getenv("HIERARCHY_TOP_DOCS", "3")))
+    hierarchy_section_chunks: int = Field(default=int(os.getenv("HIERARCHY_SECTION_CHUNKS", "32")))
+    # Ingest dedup: cut passages of >= DEDUP_MIN_WORDS words repeated from earlier pages (before
+    # splitting), then collapse near-duplicate chunks (SimHash distance <= DEDUP_MAX_DISTANCE of 64 bits)
+    dedup_chunks: bool = Field(default=os.getenv("DEDUP_CHUNKS", "true").lower() in ("1", "true", "yes"))
+    dedup_min_words: int = Field(default=int(os.getenv("DEDUP_MIN_WORDS", "30")))
+    dedup_max_distance: int = Field(default=int(os.getenv("DEDUP_MAX_DISTANCE", "3")))
+    # CLI ingest (python -m app.rag.index): chunks embedded per checkpointed batch, checkpoint file
+    ingest_batch_size: int = Field(default=int(os.getenv("INGEST_BATCH_SIZE", "64")))
+    ingest_checkpoint: str = Field(default=os.getenv("INGEST_CHECKPOINT", "data/ingest_checkpoint.json"))
+    # dry-run token estimate: "chars" (len/4, offline) or "tiktoken" (cl100k_base; may download it once)
+    token_estimate: str = Field(default=os.getenv("TOKEN_ESTIMATE", "chars"))
+
+    # Optional in-process quantized first-stage index for Chroma: '' (off), 'int8' or 'binary'
+    shadow_index: str = Field(default=os.getenv("SHADOW_INDEX", ""))
+    # candidates per requested result that get exact float32 rescoring
+    shadow_rescore_factor: int = Field(default=int(os.getenv("SHADOW_RESCORE_FACTOR", "8")))
+
+    # Share one retrieval + LLM stream between concurrent identical chat requests (per process)
+    coalesce_requests: bool = Field(default=os.getenv("COALESCE_REQUESTS", "true").lower() in ("1", "true", "yes"))
+
+    # WebSocket answers: LLM deltas are batched into one frame per WS_FLUSH_MS or WS_FLUSH_BYTES,
+    # whichever comes first (both 0 = one frame per delta)
+    ws_flush_ms: int = Field(default=int(os.getenv("WS_FLUSH_MS", "50")))
+    ws_flush_bytes: int = Field(default=int(os.getenv("WS_FLUSH_BYTES", "1024")))
+
+    # Event-loop lag monitor: sampling interval, and lag that is logged as a stall (ms)
+    loop_lag_interval_ms: int = Field(default=int(os.getenv("LOOP_LAG_INTERVAL_MS", "100")))
+    loop_lag_warn_ms: int = Field(default=int(os.getenv("LOOP_LAG_WARN_MS", "200")))
 
     # CORS
     cors_origins: str = Field(default=os.getenv("CORS_ORIGINS", "*"))
@@ -38,5 +99,17 @@ class Settings(BaseSettings):
     # Weaviate (optional remote vector DB)
     weaviate_host: str = Field(default=os.getenv("WEAVIATE_HOST", ""))
     weaviate_api_key: str = Field(default=os.getenv("WEAVIATE_API_KEY", ""))
+    # Bulk import: initial batch size (auto-tuned by dynamic batching), parallel workers, retries
+    weaviate_batch_size: int = Field(default=int(os.getenv("WEAVIATE_BATCH_SIZE", "100")))
+    weaviate_batch_workers: int = Field(default=int(os.getenv("WEAVIATE_BATCH_WORKERS", "4")))
+    weaviate_batch_retries: int = Field(default=int(os.getenv("WEAVIATE_BATCH_RETRIES", "3")))
+
+    @field_validator("relevance_threshold", "relevance_max_gap", mode="before")
+    @classmethod
+    def _empty_disables(cls, value, info):
+        # an empty RELEVANCE_* disables that cutoff (pydantic-settings also reads the env var itself)
+        if isinstance(value, str) and not value.strip():
+            return float("-inf") if info.field_name == "relevance_threshold" else float("inf")
+        return value
 
 settings = Settings()
@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from app.rag.evaluate import DEFAULT_GOLDEN, format_table, load_golden
+
+# WebSocket load test. Starts a fake OpenAI-compatible streaming server and the app itself in
+# separate processes (hash embeddings, throwaway Chroma dir, bundled PDFs), then opens N concurrent
+# /ws/chat sessions per step and reports connect time, time-to-first-token, tokens/sec per client,
+# errors, and the app's event-loop lag. The ramp stops at the first step over --max-error-rate.
+#
+#   python -m app.loadtest --clients 10,50,100,200 --tokens 200 --token-delay-ms 20
+#   python -m app.loadtest --url ws://host:8000/ws/chat   # existing deployment (real LLM costs!)
+
+_CITATIONS = "\n\nCitations:"
+
+
+def build_fake_llm(tokens: int, delay_ms: float) -> FastAPI:
+    # /v1/chat/completions streaming one word per chunk, like the OpenAI API with stream=true
+    fake = FastAPI()
+
+    @fake.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+            payload = {
+                "id": "chatcmpl-loadtest",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model") or "fake",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for i in range(tokens):
+                if delay_ms:
+                    await asyncio.sleep(delay_ms / 1000)
+                yield chunk({"content": f"w{i} "})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return fake
+
+
+def fake_llm_from_env() -> FastAPI:
+    # `uvicorn --factory app.loadtest:fake_llm_from_env` entry point; the parent process passes
+    # the answer shape through env. A factory, so importing this module builds no app.
+    return build_fake_llm(int(os.getenv("FAKE_LLM_TOKENS", "200")), float(os.getenv("FAKE_LLM_DELAY_MS", "20")))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get_json(url: str, data: Optional[dict] = None, timeout: float = 600) -> Dict[str, Any]:
+    req = urllib.request.Request(url, data=json.dumps(data).encode() if data is not None else None, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {proc.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def _uvicorn(target: str, port: int, env: Dict[str, str], extra: List[str]) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", *extra]
+    return subprocess.Popen(cmd, env={**os.environ, **env})
+
+
+def _text_of(msg) -> Optional[str]:
+    # answer text carried by a frame, or None for control frames (sources, done, errors)
+    if isinstance(msg, bytes):
+        msg = msg.decode("utf-8", "replace")
+    if msg.startswith("{"):
+        try:
+            event = json.loads(msg)
+        except ValueError:
+            return msg
+        if isinstance(event, dict) and ("type" in event or "error" in event or "answer" in event):
+            return None
+    return msg
+
+
+async def _session(r: Dict[str, Any], url: str, question: str, timeout: float, fmt: str, compression: str):
+    # fills r in place, so a session cut off by the timeout still reports what it got
+    import websockets
+
+    t0 = time.perf_counter()
+    async with websockets.connect(url, max_size=None, open_timeout=timeout, compression=None if compression == "none" else "deflate") as ws:
+        r["connect_ms"] = (time.perf_counter() - t0) * 1000
+        sent = time.perf_counter()
+        await ws.send(json.dumps({"question": question, "format": fmt}))
+        text, first, last = "", None, None
+        async for msg in ws:
+            now = time.perf_counter()
+            r["frames"] += 1
+            r["bytes"] += len(msg)
+            chunk = _text_of(msg)
+            event = json.loads(msg) if chunk is None else {}
+            if event.get("type") in ("token", "citations"):
+                chunk = event["text"]
+            elif chunk is None:
+                if event.get("error") or event.get("type") == "error":
+                    r["error"] = f"server: {event.get('error')}"
+                    break
+                if "answer" in event or event.get("type") == "no_context":
+                    r["error"] = "no_context"
+                    break
+                if event.get("type") == "done":
+                    break
+                continue
+            if first is None:
+                first = now
+                r["ttft_ms"] = (now - sent) * 1000
+            if _CITATIONS not in text:
+                last = now
+            text += chunk
+        answer = text.split(_CITATIONS, 1)[0]
+        r["tokens"] = len(answer.split())
+        if first is not None and last is not None and last > first:
+            r["tokens_per_sec"] = r["tokens"] / (last - first)
+        r["ok"] = r["error"] is None and first is not None
+        if r["ok"] is False and r["error"] is None:
+            r["error"] = "no tokens"
+
+
+async def run_session(url: str, question: str, timeout: float, fmt: str = "raw", compression: str = "deflate") -> Dict[str, Any]:
+    r: Dict[str, Any] = {"ok": False, "error": None, "connect_ms": None, "ttft_ms": None, "tokens": 0, "tokens_per_sec": None, "frames": 0, "bytes": 0}
+    t0 = time.perf_counter()
+    try:
+        # wait_for rather than asyncio.timeout (3.11+), so the tool runs on the same Pythons as the app
+        await asyncio.wait_for(_session(r, url, question, timeout, fmt, compression), timeout)
+    except (asyncio.TimeoutError, TimeoutError):
+        r["error"] = "timeout"
+    except Exception as e:
+        r["error"] = f"{type(e).__name__}: {e}"[:120]
+    r["total_ms"] = (time.perf_counter() - t0) * 1000
+    return r
+
+
+def _pct(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))], 1)
+
+
+def summarize(clients: int, results: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    ok = [r for r in results if r["ok"]]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            key = (r["error"] or "unknown").split(":")[0]
+            errors[key] = errors.get(key, 0) + 1
+    rates = [r["tokens_per_sec"] for r in ok if r["tokens_per_sec"]]
+    return {
+        "clients": clients,
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else None,
+        "errors": ", ".join(f"{k}={v}" for k, v in sorted(errors.items())) or None,
+        "connect_ms_p50": _pct([r["connect_ms"] for r in results if r["connect_ms"] is not None], 0.5),
+        "connect_ms_p95": _pct([r["connect_ms"] for r in results if r["connect_ms"] is not None], 0.95),
+        "ttft_ms_p50": _pct([r["ttft_ms"] for r in ok], 0.5),
+        "ttft_ms_p95": _pct([r["ttft_ms"] for r in ok], 0.95),
+        "tok_s_p50": round(statistics.median(rates), 1) if rates else None,
+        "tok_s_min": round(min(rates), 1) if rates else None,
+        "frames_per_answer": round(statistics.mean(r["frames"] for r in ok), 1) if ok else None,
+        "wall_s": round(wall, 2),
+    }
+
+
+async def run_step(
+    url: str,
+    clients: int,
+    questions: List[str],
+    timeout: float,
+    ramp: float,
+    same_question: bool,
+    fmt: str = "raw",
+    compression: str = "deflate",
+) -> Dict[str, Any]:
+    async def one(i: int):
+        if ramp:
+            await asyncio.sleep(ramp * i / clients)
+        q = questions[i % len(questions)]
+        # distinct questions per client so request coalescing does not share streams
+        return await run_session(url, q if same_question else f"{q} (client {i})", timeout, fmt, compression)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(clients)))
+    return summarize(clients, list(results), time.perf_counter() - start)
+
+
+def _loop_lag(http_base: Optional[str]) -> Dict[str, Any]:
+    if not http_base:
+        return {}
+    try:
+        lag = _get_json(f"{http_base}/health", timeout=10).get("event_loop") or {}
+    except Exception:
+        return {}
+    return {"loop_lag_p99_ms": lag.get("lag_ms_p99"), "loop_lag_max_ms": lag.get("lag_ms_max_recent")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent /ws/chat load test against a fake streaming LLM.")
+    parser.add_argument("--clients", default="10,50,100", help="comma-separated concurrent sessions per step (ramp)")
+    parser.add_argument("--tokens", type=int, default=200, help="tokens per fake LLM answer")
+    parser.add_argument("--token-delay-ms", type=float, default=20, help="delay between fake LLM tokens")
+    parser.add_argument("--timeout", type=float, default=120, help="per-session timeout in seconds")
+    parser.add_argument("--ramp-seconds", type=float, default=0, help="spread session starts within a step over this long")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="stop the ramp after a step above this error rate")
+    parser.add_argument("--same-question", action="store_true", help="send one question from every client (exercises coalescing)")
+    parser.add_argument("--format", default="raw", choices=["raw", "json"], help="WebSocket frame format to request")
+    parser.add_argument("--compression", default="deflate", choices=["deflate", "none"], help="offer permessage-deflate")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app under test")
+    parser.add_argument("--uvicorn-args", default="", help="extra uvicorn flags for the app under test")
+    parser.add_argument("--url", help="ws:// URL of an already running app; skips starting the fake LLM and app")
+    parser.add_argument("--golden", default=DEFAULT_GOLDEN, help="questions to ask (evaluation golden set)")
+    parser.add_argument("--json", dest="json_path", help="also write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    questions = [g["question"] for g in load_golden(args.golden)]
+    steps = [int(c) for c in args.clients.split(",") if c.strip()]
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if max(steps) * 2 + 64 > soft:
+        print(f"warning: open-file limit {soft} may cap the client side before the server (ulimit -n)", file=sys.stderr)
+
+    procs: List[subprocess.Popen] = []
+    workdir = tempfile.TemporaryDirectory(prefix="unichatbot-load-")
+    try:
+        if args.url:
+            url, http_base = args.url, None
+        else:
+            llm_port, app_port = _free_port(), _free_port()
+            procs.append(_uvicorn("app.loadtest:fake_llm_from_env", llm_port, {"FAKE_LLM_TOKENS": str(args.tokens), "FAKE_LLM_DELAY_MS": str(args.token_delay_ms)}, ["--factory"]))
+            _wait_ready(f"http://127.0.0.1:{llm_port}/docs", procs[-1])
+            app_env = {
+                "EMBEDDINGS_PROVIDER": "hash",
+                "OPENAI_API_KEY": "loadtest",
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+                "CHROMA_PERSIST_DIR": os.path.join(workdir.name, "chroma"),
+                "TENANTS_DIR": os.path.join(workdir.name, "tenants"),
+                "SHADOW_INDEX": "",
+                # hash embeddings score low; the cutoff would turn every question into no_context
+                "RELEVANCE_THRESHOLD": "",
+                "RELEVANCE_MAX_GAP": "",
+            }
+            procs.append(_uvicorn("app.main:app", app_port, app_env, ["--workers", str(args.workers), *shlex.split(args.uvicorn_args)]))
+            http_base = f"http://127.0.0.1:{app_port}"
+            _wait_ready(f"{http_base}/health", procs[-1])
+            ingest = _get_json(f"{http_base}/ingest-pdfs", {"force_reset": True, "backend": "chroma"})
+            print(f"ingested {ingest.get('chunks_indexed')} chunks with hash embeddings", file=sys.stderr)
+            url = f"ws://127.0.0.1:{app_port}/ws/chat"
+
+        rows = []
+        for clients in steps:
+            row = asyncio.run(run_step(url, clients, questions, args.timeout, args.ramp_seconds, args.same_question, args.format, args.compression))
+            row.update(_loop_lag(http_base))
+            rows.append(row)
+            print(f"{clients} clients: ok={row['ok']} errors={row['errors'] or 0} ttft_p50={row['ttft_ms_p50']}ms", file=sys.stderr)
+            if row["error_rate"] is not None and row["error_rate"] > args.max_error_rate:
+                break
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        workdir.cleanup()
+
+    print(format_table(rows))
+    passing = [r["clients"] for r in rows if r["error_rate"] is not None and r["error_rate"] <= args.max_error_rate]
+    print(f"\nhighest step within {args.max_error_rate:.0%} errors: {max(passing) if passing else 'none'} concurrent clients")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 from app.config import settings
-from app.vectorstore import reset_vectorstore, get_vectorstore, as_retriever
+from app.vectorstore import reset_vectorstore, get_vectorstore, live_chroma_version, tenant_cache_stats
 from app.api.ingest import router as ingest_router
-from app.api.chat import router as chat_router
+from app.api.chat import chat as api_chat, router as chat_router
 from app.api.ws import router as ws_router
 from app.api.upload import router as upload_router
+from app.api.shadow import router as shadow_router
 from app.rag.index import ingest_all
-from app.rag.prompts import build_prompt
-from app.rag.answer import answer_from_context
+from app.tenancy import normalize_tenant, tenant_scope
+from app.rag.shadow import load_shadow_index, shadow_stats
+from app.rag.sharded import shard_stats
+from app.monitoring import get_loop_monitor, loop_lag_stats
+import logging
 import os
 
-app = FastAPI(title="UniChatbot", version="0.1.0")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    monitor = get_loop_monitor()
+    monitor.start()
+    if settings.shadow_index:
+        try:
+            await run_in_threadpool(load_shadow_index)
+        except Exception as e:
+            # chat falls back to loading it on first query
+            logger.warning("Shadow index not loaded at startup: %s", e)
+    yield
+    await monitor.stop()
+
+
+app = FastAPI(title="UniChatbot", version="0.1.0", lifespan=lifespan)
 
 # CORS setup
 origins = [o.strip() for o in (settings.cors_origins or "").split(",") if o.strip()]
@@ -31,16 +54,13 @@ app.include_router(ingest_router)
 app.include_router(chat_router)
 app.include_router(ws_router)
 app.include_router(upload_router)
+app.include_router(shadow_router)
 
 
 class IngestRequest(BaseModel):
     force_reset: bool = False
     backend: Optional[str] = "chroma"
-
-
-class ChatRequest(BaseModel):
-    question: str
-    backend: Optional[str] = "chroma"
+    tenant: Optional[str] = None
 
 
 def _dir_writable(path: str) -> bool:
@@ -62,9 +82,11 @@ def health():
     embeddings_provider = (settings.embeddings_provider or "openai").lower()
     return {
         "status": "ok",
+        "event_loop": loop_lag_stats(),
         "paths": {
             "chroma_dir": chroma_dir,
             "pdfs_dir": pdfs_dir,
+            "tenants_dir": settings.tenants_dir,
         },
         "embeddings": {
             "provider": embeddings_provider,
@@ -87,6 +109,10 @@ def health():
             "chroma": {
                 "dir_exists": os.path.isdir(chroma_dir),
                 "dir_writable": _dir_writable(chroma_dir),
+                "live_version": live_chroma_version() or None,
+                "shadow_index": shadow_stats(),
+                "shards": shard_stats(),
+                "tenants": tenant_cache_stats(),
             },
             "weaviate": {
                 "host_set": bool(settings.weaviate_host),
@@ -101,24 +127,20 @@ def ingest(req: IngestRequest):
     backend = req.backend or "chroma"
     if backend not in ("chroma", "weaviate"):
         backend = "chroma"
-    if req.force_reset:
-        reset_vectorstore(backend=backend)  # type: ignore[arg-type]
-        # re-init to create clean store
-        get_vectorstore(backend=backend)  # type: ignore[arg-type]
-    summary = ingest_all(backend=backend)  # type: ignore[arg-type]
+    try:
+        tenant = normalize_tenant(req.tenant)
+    except ValueError as e:
+        return {"error": str(e)}
+    with tenant_scope(tenant):
+        if req.force_reset and backend != "chroma":
+            reset_vectorstore(backend=backend)  # type: ignore[arg-type]
+            # re-init to create clean store
+            get_vectorstore(backend=backend)  # type: ignore[arg-type]
+        # chroma resets are blue/green: the live index keeps serving until the rebuild is published
+        summary = ingest_all(backend=backend, force_reset=req.force_reset)  # type: ignore[arg-type]
+    summary["tenant"] = tenant
     return summary
 
 
-@app.post("/chat")
-def chat(req: ChatRequest):
-    backend = req.backend or "chroma"
-    if backend not in ("chroma", "weaviate"):
-        backend = "chroma"
-    if not req.question or not req.question.strip():
-        return {"error": "Question must not be empty."}
-    retriever = as_retriever(k=settings.top_k, backend=backend)  # type: ignore[arg-type]
-    docs = retriever.get_relevant_documents(req.question.strip())
-    # reuse existing chat flow
-    prompt, sources = build_prompt(req.question.strip(), docs)
-    answer = answer_from_context(req.question.strip(), docs)
-    return {"answer": answer, "sources": sources, "backend": backend, "top_k": settings.top_k}
+# /chat is an alias of /api/chat: one handler, request model and SSE stream for both
+app.add_api_route("/chat", api_chat, methods=["POST"], tags=["chat"])
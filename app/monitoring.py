@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Event-loop lag monitor. A background task asks to wake every LOOP_LAG_INTERVAL_MS; how late it
+# actually wakes is how long the loop was blocked (sync work in a handler, a CPU-heavy step, GC).
+# Recent samples feed the percentiles in /health; the totals cover the whole process lifetime.
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float, warn: float, window: int = 600):
+        self.interval = interval
+        self.warn = warn
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.blocked_total = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.started_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self.started_at = time.monotonic()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def record(self, lag: float):
+        lag = max(0.0, lag)
+        self.samples.append(lag)
+        self.count += 1
+        self.blocked_total += lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.warn:
+            self.stalls += 1
+            logger.warning("event loop blocked for %.0f ms", lag * 1000)
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(time.perf_counter() - expected)
+
+    def stats(self) -> Dict[str, Any]:
+        recent = sorted(self.samples)
+
+        def pct(p: float) -> Optional[float]:
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))] * 1000, 2)
+
+        return {
+            "running": self._task is not None,
+            "interval_ms": round(self.interval * 1000, 1),
+            "samples": self.count,
+            "lag_ms_p50": pct(0.5),
+            "lag_ms_p99": pct(0.99),
+            "lag_ms_max_recent": round(recent[-1] * 1000, 2) if recent else None,
+            "lag_ms_max": round(self.max_lag * 1000, 2),
+            "blocked_ms_total": round(self.blocked_total * 1000, 1),
+            "stalls": self.stalls,
+            "stall_threshold_ms": round(self.warn * 1000, 1),
+        }
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def get_loop_monitor() -> LoopLagMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopLagMonitor(
+            interval=max(1, settings.loop_lag_interval_ms) / 1000,
+            warn=max(1, settings.loop_lag_warn_ms) / 1000,
+        )
+    return _monitor
+
+
+def loop_lag_stats() -> Optional[Dict[str, Any]]:
+    return _monitor.stats() if _monitor is not None else None
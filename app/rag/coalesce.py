@@ -0,0 +1,108 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.config import settings
+from app.rag import generate
+from app.tenancy import normalize_tenant
+
+# Single-flight: concurrent requests with the same normalized question/backend/k share one
+# retrieval + LLM stream. Events are buffered per flight so a late joiner replays what was
+# already sent and then follows live. Flights are per process and end when the stream does.
+# Keys include the tenant, so identical questions to different tenants never share a flight.
+
+_Key = Tuple[str, str, str, int]
+
+
+class _Flight:
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self.cond = asyncio.Condition()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+_flights: Dict[_Key, _Flight] = {}
+_retrievals: Dict[_Key, asyncio.Future] = {}
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def _key(question: str, backend: str, k: Optional[int], tenant: Optional[str]) -> _Key:
+    return normalize_tenant(tenant), normalize_question(question), backend, k or settings.top_k
+
+
+async def _produce(key: _Key, flight: _Flight, question: str, backend: str, k: int, tenant: str):
+    try:
+        async for event in generate.chat_events(question, backend, k, tenant):
+            async with flight.cond:
+                flight.events.append(event)
+                flight.cond.notify_all()
+    finally:
+        async with flight.cond:
+            flight.done = True
+            flight.cond.notify_all()
+        if _flights.get(key) is flight:
+            del _flights[key]
+
+
+async def coalesced_chat_events(
+    question: str,
+    backend: str,
+    k: Optional[int] = None,
+    tenant: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    if not settings.coalesce_requests:
+        async for event in generate.chat_events(question, backend, k, tenant):
+            yield event
+        return
+    key = _key(question, backend, k, tenant)
+    flight = _flights.get(key)
+    if flight is None:
+        flight = _flights[key] = _Flight()
+        flight.task = asyncio.create_task(_produce(key, flight, question, backend, key[3], key[0]))
+    flight.subscribers += 1
+    pos = 0
+    try:
+        while True:
+            async with flight.cond:
+                while pos >= len(flight.events) and not flight.done:
+                    await flight.cond.wait()
+                batch = flight.events[pos:]
+                pos = len(flight.events)
+                finished = flight.done
+            for event in batch:
+                yield event
+            if finished:
+                return
+    finally:
+        flight.subscribers -= 1
+        # everyone disconnected: stop paying for tokens nobody will read
+        if flight.subscribers == 0 and not flight.done and flight.task is not None:
+            if _flights.get(key) is flight:
+                del _flights[key]
+            flight.task.cancel()
+
+
+async def coalesced_retrieve(
+    question: str,
+    backend: str,
+    k: Optional[int] = None,
+    tenant: Optional[str] = None,
+) -> generate.Scored:
+    # non-streaming chat shares the in-flight vector search for identical questions
+    if not settings.coalesce_requests:
+        return await generate.retrieve(question, backend, k, tenant)
+    key = _key(question, backend, k, tenant)
+    fut = _retrievals.get(key)
+    if fut is None:
+        fut = _retrievals[key] = asyncio.ensure_future(generate.retrieve(question, backend, key[3], key[0]))
+
+        def _forget(f):
+            if _retrievals.get(key) is f:
+                del _retrievals[key]
+
+        fut.add_done_callback(_forget)
+    # shield: one caller going away must not cancel the search for the others
+    return await asyncio.shield(fut)
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_WORD_RE = re.compile(r"\S+")
+_SHINGLE = 3
+# passage dedup: word n-grams long enough to be distinctive, and 1 in _SAMPLE of them indexed
+# (chosen by hash, so both copies sample the same positions) to bound memory on large corpora
+_PASSAGE_SHINGLE = 8
+_SAMPLE = 4
+
+
+def _shingles(text: str) -> List[str]:
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) <= _SHINGLE:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i:i + _SHINGLE]) for i in range(len(tokens) - _SHINGLE + 1)]
+
+
+def simhash(text: str) -> int:
+    # 64-bit SimHash over word 3-shingles; blake2b keeps fingerprints stable across processes
+    weights = [0] * 64
+    for sh in _shingles(text):
+        h = int.from_bytes(hashlib.blake2b(sh.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    fp = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            fp |= 1 << bit
+    return fp
+
+
+def _bands(fp: int, n_bands: int) -> List[Tuple[int, int]]:
+    # with max_distance + 1 bands, two fingerprints within max_distance bits share at least one band
+    width = 64 // n_bands
+    out = []
+    for b in range(n_bands):
+        lo = b * width
+        hi = 64 if b == n_bands - 1 else lo + width
+        out.append((b, (fp >> lo) & ((1 << (hi - lo)) - 1)))
+    return out
+
+
+def _ref(doc) -> Dict[str, Any]:
+    md = getattr(doc, "metadata", {}) or {}
+    return {"file": md.get("file") or md.get("source"), "page": md.get("page")}
+
+
+def _refs(doc) -> List[Dict[str, Any]]:
+    # the doc's own location plus any recorded by an earlier dedup pass
+    md = getattr(doc, "metadata", {}) or {}
+    refs = [_ref(doc)]
+    for ref in json.loads(md.get("duplicate_sources") or "[]"):
+        if ref not in refs:
+            refs.append(ref)
+    return refs
+
+
+def _mark_duplicates(doc, refs: List[Dict[str, Any]]):
+    # vector store metadata must be scalar, so the source list is stored as JSON
+    doc.metadata = {**doc.metadata, "duplicate_sources": json.dumps(refs), "duplicates": len(refs) - 1}
+
+
+def _words(text: str) -> List[Tuple[int, int, str]]:
+    # (start, end, normalized) per whitespace-separated word that has any letters or digits
+    words = [(m.start(), m.end(), "".join(_TOKEN_RE.findall(m.group().lower()))) for m in _WORD_RE.finditer(text)]
+    return [w for w in words if w[2]]
+
+
+def dedup_passages(docs, min_words: Optional[int] = None) -> Tuple[list, Dict[str, Any]]:
+    # Runs on pages before splitting, so a repeated passage is found wherever chunk boundaries
+    # fall: a span of at least min_words words that also occurs on an earlier page is cut from
+    # the later one, and the page holding the first copy records where else it appeared.
+    # Sampled 8-word shingles find candidate matches; each is then extended word by word
+    # against the earlier page, so the cut covers exactly the repeated words.
+    min_words = settings.dedup_min_words if min_words is None else min_words
+    seen: Dict[int, Tuple[int, int]] = {}
+    page_words: Dict[int, List[str]] = {}
+    extra_refs: Dict[int, List[Dict[str, Any]]] = {}
+    out: list = []
+    passages = words_removed = chars_removed = 0
+
+    def words_of(idx: int) -> List[str]:
+        if idx not in page_words:
+            page_words[idx] = [w[2] for w in _words(docs[idx].page_content or "")]
+        return page_words[idx]
+
+    for idx, doc in enumerate(docs):
+        text = doc.page_content or ""
+        words = _words(text)
+        norm = [w[2] for w in words]
+        anchors = []
+        for i in range(len(words) - _PASSAGE_SHINGLE + 1):
+            h = int.from_bytes(hashlib.blake2b(" ".join(norm[i:i + _PASSAGE_SHINGLE]).encode(), digest_size=8).digest(), "big")
+            if h % _SAMPLE == 0:
+                anchors.append((i, h))
+
+        spans: List[List[Any]] = []
+        for i, h in anchors:
+            if h not in seen or (spans and i < spans[-1][1]):
+                continue
+            owner, j = seen[h]
+            other = words_of(owner)
+            if other[j:j + _PASSAGE_SHINGLE] != norm[i:i + _PASSAGE_SHINGLE]:
+                continue  # hash collision
+            start, end = i, i + _PASSAGE_SHINGLE
+            while start > 0 and j - (i - start) > 0 and norm[start - 1] == other[j - (i - start) - 1]:
+                start -= 1
+            while end < len(norm) and j + (end - i) < len(other) and norm[end] == other[j + (end - i)]:
+                end += 1
+            if spans and start <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], end)
+                spans[-1][2].add(owner)
+            else:
+                spans.append([start, end, {owner}])
+        for i, h in anchors:
+            seen.setdefault(h, (idx, i))
+
+        cuts = [(a, b, owners) for a, b, owners in spans if b - a >= max(min_words, _PASSAGE_SHINGLE)]
+        if not cuts:
+            out.append(doc)
+            continue
+        parts, pos = [], 0
+        for a, b, owners in cuts:
+            start, end = words[a][0], words[b - 1][1]
+            parts.append(text[pos:start])
+            pos = end
+            passages += 1
+            words_removed += b - a
+            chars_removed += end - start
+            for owner in owners:
+                refs = extra_refs.setdefault(owner, [])
+                if _ref(doc) not in refs:
+                    refs.append(_ref(doc))
+        parts.append(text[pos:])
+        out.append(type(doc)(page_content="".join(parts), metadata=dict(doc.metadata or {})))
+
+    for owner, refs in extra_refs.items():
+        doc = out[owner]
+        merged = _refs(doc) + [r for r in refs if r not in _refs(doc)]
+        if len(merged) > 1:
+            _mark_duplicates(doc, merged)
+
+    report = {
+        "passages_removed": passages,
+        "words_removed": words_removed,
+        "chars_removed": chars_removed,
+        "pages_changed": sum(1 for a, b in zip(docs, out) if a is not b),
+        "min_words": min_words,
+    }
+    return out, report
+
+
+def dedup_chunks(chunks, max_distance: Optional[int] = None) -> Tuple[list, Dict[str, Any]]:
+    max_distance = settings.dedup_max_distance if max_distance is None else max_distance
+    n_bands = min(64, max(1, max_distance + 1))
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    kept: list = []
+    fingerprints: List[int] = []
+    members: List[List[Dict[str, Any]]] = []
+    chars_removed = 0
+
+    for doc in chunks:
+        fp = simhash(doc.page_content or "")
+        bands = _bands(fp, n_bands)
+        match = None
+        for band in bands:
+            for idx in buckets.get(band, ()):
+                if bin(fp ^ fingerprints[idx]).count("1") <= max_distance:
+                    match = idx
+                    break
+            if match is not None:
+                break
+        if match is not None:
+            # collapse into the first-seen chunk, remembering where else the text appears
+            for ref in _refs(doc):
+                if ref not in members[match]:
+                    members[match].append(ref)
+            chars_removed += len(doc.page_content or "")
+            continue
+        idx = len(kept)
+        kept.append(doc)
+        fingerprints.append(fp)
+        members.append(_refs(doc))
+        for band in bands:
+            buckets.setdefault(band, []).append(idx)
+
+    for doc, refs in zip(kept, members):
+        if len(refs) > 1:
+            _mark_duplicates(doc, refs)
+
+    removed = len(chunks) - len(kept)
+    report = {
+        "chunks_in": len(chunks),
+        "chunks_out": len(kept),
+        "removed": removed,
+        "removed_pct": round(100.0 * removed / len(chunks), 1) if chunks else 0.0,
+        "chars_removed": chars_removed,
+        "max_distance": max_distance,
+    }
+    return kept, report
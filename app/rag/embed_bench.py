@@ -0,0 +1,94 @@
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+from app.config import settings
+from app import vectorstore
+from app.rag.evaluate import _overrides, format_table
+from app.rag.loaders import discover_pdfs, load_pdfs
+from app.rag.splitter import split_docs
+
+# Embedding throughput per provider on real chunks of the bundled PDFs: ingest-style batch
+# throughput (chunks/s) and single-query latency. Remote providers without credentials are skipped.
+#
+#   python -m app.rag.embed_bench --providers onnx,openai,gemini --chunks 256 --threads 1,4
+
+_QUERY = "What is the attendance policy for undergraduate courses?"
+
+
+def _configured(provider: str) -> bool:
+    if provider == "openai":
+        return bool(settings.openai_api_key)
+    if provider == "gemini":
+        return bool(settings.gemini_api_key)
+    return True
+
+
+def bench_provider(provider: str, texts: List[str], queries: int = 20, **overrides) -> Dict[str, Any]:
+    row: Dict[str, Any] = {"provider": provider, **overrides}
+    if not _configured(provider):
+        return {**row, "status": "skipped (no API key)"}
+    with _overrides(embeddings_provider=provider, **overrides):
+        vectorstore.clear_cached_stores()
+        try:
+            t0 = time.perf_counter()
+            emb = vectorstore.get_embeddings()
+            emb.embed_query("warm up")
+            row["load_seconds"] = round(time.perf_counter() - t0, 3)
+
+            t0 = time.perf_counter()
+            vecs = emb.embed_documents(texts)
+            batch_seconds = time.perf_counter() - t0
+
+            latencies = []
+            for i in range(queries):
+                # distinct texts so the ONNX token cache does not flatter the number
+                t0 = time.perf_counter()
+                emb.embed_query(f"{_QUERY} ({i})")
+                latencies.append((time.perf_counter() - t0) * 1000)
+        except Exception as e:
+            return {**row, "status": f"error: {e}"}
+    return {
+        **row,
+        "status": "ok",
+        "dim": len(vecs[0]) if vecs else None,
+        "chunks": len(texts),
+        "chunks_per_sec": round(len(texts) / batch_seconds, 1) if batch_seconds else None,
+        "query_ms_p50": round(statistics.median(latencies), 2),
+        "query_ms_max": round(max(latencies), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark embedding providers on chunks of the bundled PDFs.")
+    parser.add_argument("--providers", default="onnx,openai,gemini", help="comma-separated: onnx,openai,gemini,ollama,hash")
+    parser.add_argument("--chunks", type=int, default=256, help="number of chunks to embed per provider")
+    parser.add_argument("--queries", type=int, default=20, help="single-query calls for latency")
+    parser.add_argument("--threads", default="", help="comma-separated ONNX intra-op thread counts to compare")
+    parser.add_argument("--batch-sizes", default="", help="comma-separated ONNX batch sizes to compare")
+    parser.add_argument("--json", dest="json_path", help="also write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    docs, _ = load_pdfs(sorted(discover_pdfs(settings.pdfs_dir)))
+    texts = [c.page_content for c in split_docs(docs)][: args.chunks]
+    rows = []
+    for provider in [p.strip() for p in args.providers.split(",") if p.strip()]:
+        if provider != "onnx":
+            rows.append(bench_provider(provider, texts, args.queries))
+            continue
+        threads = [int(t) for t in args.threads.split(",") if t.strip()] or [settings.onnx_threads]
+        sizes = [int(b) for b in args.batch_sizes.split(",") if b.strip()] or [settings.onnx_batch_size]
+        for t in threads:
+            for b in sizes:
+                rows.append(bench_provider(provider, texts, args.queries, onnx_threads=t, onnx_batch_size=b))
+
+    cols = ["provider", "onnx_threads", "onnx_batch_size", "status", "dim", "chunks", "chunks_per_sec", "query_ms_p50", "query_ms_max", "load_seconds"]
+    print(format_table([{c: r.get(c) for c in cols} for r in rows]))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
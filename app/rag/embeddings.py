@@ -0,0 +1,154 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how if in is it its may must not of on or "
+    "shall should that the their there these this to was what when where which who will with".split()
+)
+
+
+class HashEmbeddings(Embeddings):
+    # Deterministic, offline lexical embeddings: hashed unigrams + bigrams with log tf,
+    # L2-normalized. Not semantic, but stable across runs and machines (evaluation, tests).
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts = {}
+        for f in features:
+            h = int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "big")
+            idx, sign = h % self.dim, 1.0 if (h >> 63) & 1 else -1.0
+            counts[idx] = counts.get(idx, 0.0) + sign
+        vec = [0.0] * self.dim
+        for idx, c in counts.items():
+            vec[idx] = math.copysign(1.0 + math.log(abs(c)), c) if c else 0.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+# Chroma downloads its default all-MiniLM-L6-v2 export here (model.onnx + tokenizer.json)
+DEFAULT_ONNX_MODEL_DIR = os.path.join("~", ".cache", "chroma", "onnx_models", "all-MiniLM-L6-v2", "onnx")
+
+
+class OnnxEmbeddings(Embeddings):
+    # In-process sentence embeddings on ONNX Runtime (CPU): fast tokenizer, batches sorted by
+    # length and padded only to the longest text in the batch, mean pooling over the attention
+    # mask, L2-normalized. Token ids are kept in an LRU so repeated texts (queries) skip tokenizing.
+
+    def __init__(
+        self,
+        model_dir: Optional[str] = None,
+        batch_size: int = 32,
+        threads: int = 0,
+        max_length: int = 256,
+        cache_size: int = 4096,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = os.path.expanduser(model_dir or DEFAULT_ONNX_MODEL_DIR)
+        model_path = os.path.join(model_dir, "model.onnx")
+        tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+        if not (os.path.exists(model_path) and os.path.exists(tokenizer_path)):
+            if model_dir != os.path.expanduser(DEFAULT_ONNX_MODEL_DIR):
+                raise RuntimeError(f"ONNX model not found: expected model.onnx and tokenizer.json in {model_dir}")
+            # the default model is the one Chroma uses; embedding one text through Chroma's public
+            # embedding function makes it fetch and verify the export once
+            from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+            ONNXMiniLM_L6_V2()(["warmup"])
+            if not (os.path.exists(model_path) and os.path.exists(tokenizer_path)):
+                raise RuntimeError(f"ONNX model download did not produce model.onnx and tokenizer.json in {model_dir}")
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = max(0, threads)  # 0 = one per physical core
+        opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.log_severity_level = 3
+        self._session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.no_padding()
+        padding = self._tokenizer.token_to_id("[PAD]")
+        self._pad_id = padding if padding is not None else 0
+        self.batch_size = max(1, batch_size)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _token_ids(self, texts: List[str]) -> List[np.ndarray]:
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing = []
+        with self._cache_lock:
+            for i, t in enumerate(texts):
+                ids = self._cache.get(t)
+                if ids is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(t)
+                    out[i] = ids
+            self.cache_hits += len(texts) - len(missing)
+            self.cache_misses += len(missing)
+        if missing:
+            encoded = self._tokenizer.encode_batch([texts[i] for i in missing])
+            with self._cache_lock:
+                for i, enc in zip(missing, encoded):
+                    ids = np.asarray(enc.ids, dtype=np.int64)
+                    out[i] = ids
+                    if self.cache_size > 0:
+                        self._cache[texts[i]] = ids
+                        while len(self._cache) > self.cache_size:
+                            self._cache.popitem(last=False)
+        return out  # type: ignore[return-value]
+
+    def _forward(self, ids: List[np.ndarray]) -> np.ndarray:
+        longest = max(len(x) for x in ids)
+        input_ids = np.full((len(ids), longest), self._pad_id, dtype=np.int64)
+        mask = np.zeros((len(ids), longest), dtype=np.int64)
+        for row, x in enumerate(ids):
+            input_ids[row, :len(x)] = x
+            mask[row, :len(x)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": mask, "token_type_ids": np.zeros_like(input_ids)}
+        hidden = self._session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.where(norms == 0, 1.0, norms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        ids = self._token_ids(texts)
+        # similar lengths share a batch, so little compute goes into padding
+        order = sorted(range(len(texts)), key=lambda i: len(ids[i]))
+        out = np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vecs = self._forward([ids[i] for i in batch])
+            if out.shape[1] == 0:
+                out = np.zeros((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[batch] = vecs
+        return out.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,196 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Sequence
+from app.config import settings
+from app import vectorstore
+from app.rag.index import index_docs, split_and_dedup
+from app.rag.loaders import discover_pdfs, load_pdfs
+
+# Retrieval quality-vs-latency sweep over the bundled PDFs. Each configuration goes through the
+# real split_and_dedup / index_docs / as_retriever code into a throwaway Chroma dir, with offline
+# 'hash' embeddings by default so runs are deterministic and free.
+#
+#   python -m app.rag.evaluate --chunk-sizes 500,1000 --overlaps 100,200 --top-k 2,4,8
+
+DEFAULT_GOLDEN = os.path.join("data", "eval", "golden.json")
+
+
+@contextlib.contextmanager
+def _overrides(**values) -> Iterator[None]:
+    old = {k: getattr(settings, k) for k in values}
+    for k, v in values.items():
+        setattr(settings, k, v)
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            setattr(settings, k, v)
+        vectorstore.clear_cached_stores()
+
+
+def load_golden(path: str = DEFAULT_GOLDEN) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _ref(doc):
+    md = getattr(doc, "metadata", {}) or {}
+    return os.path.basename(str(md.get("file") or md.get("source") or "")), md.get("page")
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total
+
+
+def _score(docs, expected) -> Dict[str, float]:
+    wanted = {(e["file"], e["page"]) for e in expected}
+    found, first = set(), None
+    for rank, d in enumerate(docs, start=1):
+        ref = _ref(d)
+        if ref in wanted:
+            found.add(ref)
+            first = first or rank
+    return {"recall": len(found) / len(wanted), "rr": 1.0 / first if first else 0.0}
+
+
+def evaluate_config(
+    docs,
+    golden,
+    backend: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    top_ks: List[int],
+    workdir: str,
+    modes: Sequence[str] = ("flat",),
+) -> List[Dict[str, Any]]:
+    persist = os.path.join(workdir, f"{backend}-{chunk_size}-{chunk_overlap}")
+    # ingest builds the section index only in hierarchical mode
+    ingest_mode = "hierarchical" if "hierarchical" in modes else "flat"
+    with _overrides(chunk_size=chunk_size, chunk_overlap=chunk_overlap, chroma_persist_dir=persist, retrieval_mode=ingest_mode):
+        vectorstore.clear_cached_stores()
+        start = time.perf_counter()
+        _, chunks, _ = split_and_dedup(docs)
+        if backend == "chroma":
+            version = vectorstore.new_chroma_version()
+            summary = index_docs(chunks, backend=backend, version=version)
+            vectorstore.publish_chroma_version(version)
+        else:
+            vectorstore.reset_vectorstore(backend)  # type: ignore[arg-type]
+            summary = index_docs(chunks, backend=backend)
+        ingest_seconds = time.perf_counter() - start
+        if summary.get("status") not in ("ok", "partial"):
+            raise RuntimeError(f"indexing failed for {backend} {chunk_size}/{chunk_overlap}: {summary.get('error')}")
+        index_bytes = _dir_bytes(vectorstore.chroma_version_path()) if backend == "chroma" else None
+
+        rows = []
+        for mode, k in itertools.product(modes if backend == "chroma" else ["flat"], top_ks):
+            settings.retrieval_mode = mode
+            retriever = vectorstore.as_retriever(k=k, backend=backend)  # type: ignore[arg-type]
+            retriever.invoke(golden[0]["question"])  # warm-up: loads the HNSW index / shadow codes
+            latencies, recalls, rrs = [], [], []
+            for g in golden:
+                t0 = time.perf_counter()
+                got = retriever.invoke(g["question"])
+                latencies.append((time.perf_counter() - t0) * 1000)
+                s = _score(got, g["expected"])
+                recalls.append(s["recall"])
+                rrs.append(s["rr"])
+            latencies.sort()
+            rows.append({
+                "backend": backend,
+                "mode": mode,
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "top_k": k,
+                "recall@k": round(statistics.mean(recalls), 4),
+                "mrr": round(statistics.mean(rrs), 4),
+                "chunks": len(chunks),
+                "index_bytes": index_bytes,
+                "ingest_seconds": round(ingest_seconds, 3),
+                # embedding spend proxy (~4 chars/token)
+                "est_embed_tokens": sum(len(c.page_content) for c in chunks) // 4,
+                "query_ms_p50": round(latencies[len(latencies) // 2], 2),
+                "query_ms_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+            })
+        return rows
+
+
+def run_eval(
+    chunk_sizes: List[int],
+    overlaps: List[int],
+    top_ks: List[int],
+    backends: List[str],
+    golden_path: str = DEFAULT_GOLDEN,
+    embeddings_provider: str = "hash",
+    modes: Sequence[str] = ("flat",),
+) -> List[Dict[str, Any]]:
+    golden = load_golden(golden_path)
+    docs, errors = load_pdfs(sorted(discover_pdfs(settings.pdfs_dir)))
+    if errors:
+        raise RuntimeError(f"failed to load PDFs: {errors}")
+    rows: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="unichatbot-eval-") as workdir, _overrides(embeddings_provider=embeddings_provider):
+        for backend in backends:
+            for cs in chunk_sizes:
+                for co in overlaps:
+                    if co >= cs:
+                        continue
+                    rows.extend(evaluate_config(docs, golden, backend, cs, co, top_ks, workdir, modes))
+    return rows
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    if not rows:
+        return "(no results)"
+    cols = list(rows[0].keys())
+    cells = [[("-" if r[c] is None else str(r[c])) for c in cols] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(cols)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(cols, widths))]
+    lines.append("  ".join("-" * w for w in widths))
+    lines.extend("  ".join(v.rjust(w) for v, w in zip(row, widths)) for row in cells)
+    return "\n".join(lines)
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep chunking/top-k/backend and report retrieval quality vs latency.")
+    parser.add_argument("--chunk-sizes", type=_ints, default=[settings.chunk_size])
+    parser.add_argument("--overlaps", type=_ints, default=[settings.chunk_overlap])
+    parser.add_argument("--top-k", type=_ints, default=[settings.top_k])
+    parser.add_argument("--backends", default="chroma", help="comma-separated: chroma,weaviate")
+    parser.add_argument("--modes", default="flat", help="comma-separated Chroma retrieval modes: flat,hierarchical")
+    parser.add_argument("--golden", default=DEFAULT_GOLDEN)
+    parser.add_argument("--embeddings", default="hash", help="embeddings provider (default: offline 'hash')")
+    parser.add_argument("--json", dest="json_path", help="also write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    rows = run_eval(
+        args.chunk_sizes,
+        args.overlaps,
+        args.top_k,
+        [b.strip() for b in args.backends.split(",") if b.strip()],
+        golden_path=args.golden,
+        embeddings_provider=args.embeddings,
+        modes=[m.strip() for m in args.modes.split(",") if m.strip()],
+    )
+    print(format_table(rows))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
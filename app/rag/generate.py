@@ -0,0 +1,148 @@
+import contextlib
+import math
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from langchain_core.documents import Document
+from app.config import settings
+from app.tenancy import tenant_scope
+from app.vectorstore import as_retriever, chroma_lease, get_vectorstore
+from app.rag.prompts import build_system_prompt, build_user_prompt, citations_text, source_list
+
+# LLM clients
+from openai import OpenAI
+import google.generativeai as genai
+
+NO_CONTEXT_ANSWER = "I don't have enough information to answer that."
+
+
+Scored = List[Tuple[Document, float]]
+
+
+def _chroma_relevance(distance: float) -> float:
+    # Chroma returns squared L2 distance; this is LangChain's relevance for it, and the scale
+    # RELEVANCE_THRESHOLD / RELEVANCE_MAX_GAP are set on
+    return 1.0 - distance / math.sqrt(2)
+
+
+def _weaviate_relevance(dot: float) -> float:
+    # The Weaviate wrapper returns the raw dot product (its own normalizer squeezes that into
+    # ~[0.27, 0.73]). For unit-length embeddings the squared L2 distance is 2 - 2 * dot, so this
+    # puts Weaviate scores on the Chroma scale and one threshold works for both backends.
+    return _chroma_relevance(2.0 - 2.0 * dot)
+
+
+_RELEVANCE = {"chroma": _chroma_relevance, "weaviate": _weaviate_relevance}
+
+
+def search_with_scores(question: str, backend: str, k: int) -> Scored:
+    # the lease keeps an eviction from closing the clients while this query runs
+    with chroma_lease():
+        retriever = as_retriever(k=k, backend=backend)  # type: ignore[arg-type]
+        if hasattr(retriever, "search_with_scores"):
+            # shadow / hierarchical / sharded retrievers already score on the Chroma scale
+            return retriever.search_with_scores(question)
+        relevance = _RELEVANCE.get(backend, _chroma_relevance)
+        raw = get_vectorstore(backend).similarity_search_with_score(question, k=k)  # type: ignore[arg-type]
+        return [(doc, relevance(float(score))) for doc, score in raw]
+
+
+def score_cutoff(scored: Scored, threshold: Optional[float] = None, max_gap: Optional[float] = None) -> Scored:
+    # absolute threshold, plus adaptive k: drop results that fall off sharply from the best one
+    if not scored:
+        return []
+    threshold = settings.relevance_threshold if threshold is None else threshold
+    max_gap = settings.relevance_max_gap if max_gap is None else max_gap
+    best = max(s for _, s in scored)
+    return [(d, s) for d, s in scored if s >= threshold and best - s <= max_gap]
+
+
+def with_scores(sources: List[dict], scored: Scored) -> List[dict]:
+    return [{**src, "score": round(float(score), 4)} for src, (_, score) in zip(sources, scored)]
+
+
+async def retrieve(question: str, backend: str, k: Optional[int] = None, tenant: Optional[str] = None) -> Scored:
+    # vector search (and query embedding) is blocking I/O; keep it off the event loop.
+    # The worker thread inherits the tenant from this context.
+    with tenant_scope(tenant):
+        scored = await run_in_threadpool(search_with_scores, question, backend, k or settings.top_k)
+    return score_cutoff(scored)
+
+
+def _close_stream(stream):
+    # a client that disconnects mid-answer must not leave the provider's HTTP stream open
+    # (and generating) until the garbage collector finds it
+    close = getattr(stream, "close", None)
+    if close is not None:
+        with contextlib.suppress(Exception):
+            close()
+
+
+async def stream_llm(system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+    # Provider SDK streams are synchronous iterators; each next() runs in the threadpool
+    provider = (settings.embeddings_provider or "openai").lower()
+    if provider == "gemini":
+        if not settings.gemini_api_key:
+            raise RuntimeError("GEMINI_API_KEY not configured.")
+        genai.configure(api_key=settings.gemini_api_key)
+        gem_model = settings.gemini_chat_model or "gemini-2.5-flash"
+        if gem_model.startswith("models/"):
+            gem_model = gem_model.split("/", 1)[1]
+        model = genai.GenerativeModel(model_name=gem_model, system_instruction=system_prompt)
+        response = await run_in_threadpool(model.generate_content, user_prompt, stream=True)
+        try:
+            async for chunk in iterate_in_threadpool(response):
+                txt = getattr(chunk, "text", None)
+                if txt:
+                    yield txt
+        finally:
+            _close_stream(response)
+    else:
+        if not settings.openai_api_key:
+            raise RuntimeError("OPENAI_API_KEY not configured.")
+        client = OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url or None)
+        stream = await run_in_threadpool(
+            client.chat.completions.create,
+            model=settings.openai_chat_model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            stream=True,
+        )
+        try:
+            async for chunk in iterate_in_threadpool(stream):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        finally:
+            _close_stream(stream)
+
+
+async def chat_events(
+    question: str,
+    backend: str,
+    k: Optional[int] = None,
+    tenant: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    # Shared streaming pipeline for the WebSocket and SSE chat endpoints. Events, in order:
+    # sources (right after retrieval), token per LLM delta, citations, done.
+    # no_context replaces all of them when nothing passes the relevance cutoff; error ends the stream early.
+    k = k or settings.top_k
+    try:
+        scored = await retrieve(question, backend, k, tenant)
+        # Strict grounding: if no docs, immediately refuse without paying for a generation
+        if not scored:
+            yield {"type": "no_context", "answer": NO_CONTEXT_ANSWER, "sources": []}
+            return
+        docs = [d for d, _ in scored]
+        yield {"type": "sources", "sources": with_scores(source_list(docs), scored), "backend": backend, "top_k": k}
+        tokens = stream_llm(build_system_prompt(), build_user_prompt(question, docs))
+        # closed as soon as this generator is, which closes the upstream stream
+        async with contextlib.aclosing(tokens):
+            async for text in tokens:
+                yield {"type": "token", "text": text}
+        # Append citations at the end of the streamed output
+        yield {"type": "citations", "text": citations_text(docs)}
+        yield {"type": "done"}
+    except Exception as e:
+        yield {"type": "error", "error": str(e)}
@@ -0,0 +1,296 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.config import settings
+from app.rag.vector_file import VectorFile, load_vector_file, vector_file_name
+from app.tenancy import current_tenant
+from app.vectorstore import (
+    _chroma_collection_name,
+    _get_chroma_client,
+    chroma_version_path,
+    get_chroma_vectorstore,
+    get_embeddings,
+    live_chroma_version,
+    on_tenant_evicted,
+)
+
+# Two-stage retrieval for large corpora. A small "sections" collection holds one centroid per
+# run of consecutive pages of a PDF (about HIERARCHY_SECTION_CHUNKS chunks each), computed from
+# the chunk embeddings already in Chroma. A query first ranks sections, then scores exactly
+# only the chunks of the top HIERARCHY_TOP_DOCS sections (their ids are stored on the section),
+# so the second stage costs the same whatever the corpus size.
+#
+# Every build writes a new, uniquely named sections collection and then switches the DOC_INDEX
+# file in the version dir to it (atomically, like CURRENT), so readers never see a missing or
+# half-built one. Only ingest builds it (in hierarchical mode), never the query path: workers
+# would race each other writing one Chroma directory. A version without one is searched flat.
+# The second stage scores chunks from the version's vector file (vector_file.py), so it does
+# not load Chroma's HNSW segment either.
+
+logger = logging.getLogger(__name__)
+
+_PAGE = 5000
+_DOC_INDEX_FILE = "DOC_INDEX"
+_load_lock = threading.Lock()
+# per tenant; dropped when the tenant's store is evicted
+_sections_cache: Dict[str, "_Sections"] = {}
+# rebuilds by another worker (appends to the live version) are picked up by a pointer check this often
+_RECHECK_SECONDS = 30.0
+# version paths already warned about, so a missing index is logged once, not per query
+_warned: Set[str] = set()
+
+
+def hierarchical_enabled() -> bool:
+    return (settings.retrieval_mode or "").lower() == "hierarchical"
+
+
+def _doc_collection_prefix() -> str:
+    return f"{_chroma_collection_name()}_docs"
+
+
+def doc_index_collection(version: Optional[str] = None) -> Optional[str]:
+    # name of the version's current sections collection, None if it was never built
+    try:
+        with open(os.path.join(chroma_version_path(version), _DOC_INDEX_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _switch_doc_index(client, version: Optional[str], name: str):
+    previous = doc_index_collection(version)
+    pointer = os.path.join(chroma_version_path(version), _DOC_INDEX_FILE)
+    tmp = f"{pointer}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, pointer)
+    invalidate_sections()
+    # the replaced collection stays for readers still loading it; anything older goes
+    prefix = _doc_collection_prefix()
+    for collection in client.list_collections():
+        other = getattr(collection, "name", collection)
+        if other.startswith(prefix) and other not in (name, previous):
+            try:
+                client.delete_collection(other)
+            except Exception:
+                pass
+
+
+def _relevance(sq_l2: float) -> float:
+    # same scale as Chroma's default l2 relevance, as in the shadow index
+    return 1.0 - sq_l2 / math.sqrt(2)
+
+
+def _sections(metas: List[Dict[str, Any]], section_chunks: int) -> List[Dict[str, Any]]:
+    # group chunk rows by file, then pack whole pages in order until a section is full
+    by_file: Dict[str, Dict[int, List[int]]] = {}
+    for row, md in enumerate(metas):
+        md = md or {}
+        file = str(md.get("file") or md.get("source") or "")
+        page = md.get("page")
+        by_file.setdefault(file, {}).setdefault(page if isinstance(page, int) else -1, []).append(row)
+    sections = []
+    for file in sorted(by_file):
+        current: Dict[str, Any] = {}
+        for page in sorted(by_file[file]):
+            if not current:
+                current = {"file": file, "page_start": page, "rows": []}
+            current["page_end"] = page
+            current["rows"].extend(by_file[file][page])
+            if len(current["rows"]) >= section_chunks:
+                sections.append(current)
+                current = {}
+        if current:
+            sections.append(current)
+    return sections
+
+
+def build_doc_index(version: Optional[str] = None) -> Dict[str, Any]:
+    # Build the section centroids for a Chroma version from its stored chunk embeddings.
+    start = time.perf_counter()
+    client = _get_chroma_client(version)
+    chunks = client.get_or_create_collection(_chroma_collection_name())
+    ids: List[str] = []
+    metas: List[Dict[str, Any]] = []
+    vecs = []
+    offset = 0
+    while True:
+        page = chunks.get(include=["embeddings", "metadatas"], limit=_PAGE, offset=offset)
+        if not page.get("ids"):
+            break
+        ids.extend(page["ids"])
+        metas.extend(page["metadatas"])
+        vecs.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+
+    name = f"{_doc_collection_prefix()}_{uuid.uuid4().hex[:8]}"
+    docs = client.create_collection(name)
+    if not metas:
+        _switch_doc_index(client, version, name)
+        return {"sections": 0, "chunks": 0, "seconds": round(time.perf_counter() - start, 3)}
+
+    matrix = np.concatenate(vecs)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1.0, norms)
+    sections = _sections(metas, max(1, settings.hierarchy_section_chunks))
+    section_ids, embeddings, section_metas, texts = [], [], [], []
+    for s in sections:
+        centroid = matrix[s["rows"]].mean(axis=0)
+        centroid /= np.linalg.norm(centroid) or 1.0
+        section_ids.append(f"{s['file']}#{s['page_start']}-{s['page_end']}")
+        embeddings.append(centroid.tolist())
+        section_metas.append({
+            "file": s["file"],
+            "page_start": s["page_start"],
+            "page_end": s["page_end"],
+            "chunks": len(s["rows"]),
+            # metadata must be scalar, so member chunk ids are stored as JSON
+            "chunk_ids": json.dumps([ids[r] for r in s["rows"]]),
+        })
+        texts.append(s["file"])
+    for i in range(0, len(section_ids), _PAGE):
+        docs.add(
+            ids=section_ids[i:i + _PAGE],
+            embeddings=embeddings[i:i + _PAGE],
+            metadatas=section_metas[i:i + _PAGE],
+            documents=texts[i:i + _PAGE],
+        )
+    _switch_doc_index(client, version, name)
+    return {"sections": len(section_ids), "chunks": len(metas), "seconds": round(time.perf_counter() - start, 3)}
+
+
+class _Sections:
+    # in-process copy of the section table (centroids + member ids): it is small, and keeping
+    # it in RAM makes the first stage a numpy scan instead of another Chroma round trip
+    def __init__(self, path: str, name: str, centroids: np.ndarray, metas: List[Dict[str, Any]], vectors: VectorFile):
+        self.path = path
+        self.name = name
+        self.centroids = centroids
+        self.metas = metas
+        self.vectors = vectors
+        self.checked_at = time.monotonic()
+
+
+def _load_sections(client, path: str, name: str, vectors: VectorFile) -> Optional[_Sections]:
+    try:
+        docs = client.get_collection(name)
+    except Exception as e:
+        # DOC_INDEX names a collection that is gone (deleted by a concurrent rebuild)
+        _warn_once(path, f"Section collection {name} not found ({e}); searching flat until the next ingest")
+        return None
+    metas: List[Dict[str, Any]] = []
+    vecs = []
+    offset = 0
+    while True:
+        page = docs.get(include=["embeddings", "metadatas"], limit=_PAGE, offset=offset)
+        if not page.get("ids"):
+            break
+        metas.extend(page["metadatas"])
+        vecs.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    centroids = np.concatenate(vecs) if vecs else np.zeros((0, 0), dtype=np.float32)
+    return _Sections(path, name, centroids, metas, vectors)
+
+
+def _warn_once(path: str, message: str):
+    if path not in _warned:
+        _warned.add(path)
+        logger.warning(message)
+
+
+def _get_sections() -> Optional[_Sections]:
+    tenant = current_tenant()
+    version = live_chroma_version()
+    path = chroma_version_path(version)
+    cached = _sections_cache.get(tenant)
+    if cached is not None and cached.path == path:
+        if time.monotonic() - cached.checked_at < _RECHECK_SECONDS:
+            return cached
+        cached.checked_at = time.monotonic()
+        if doc_index_collection(version) == cached.name and vector_file_name(version) == cached.vectors.name:
+            return cached
+    name = doc_index_collection(version)
+    vectors_name = vector_file_name(version)
+    if name is None or vectors_name is None:
+        # built in flat mode, or before sections were scored from a vector file
+        _warn_once(path, f"No section index or vector file for {path}; searching flat. Re-ingest with RETRIEVAL_MODE=hierarchical to build them.")
+        return None
+    with _load_lock:
+        current = _sections_cache.get(tenant)
+        if current is None or current.path != path or current.name != name or current.vectors.name != vectors_name:
+            try:
+                vectors = load_vector_file(version)
+            except OSError as e:
+                vectors = None
+                _warn_once(path, f"Vector file {vectors_name} not readable ({e}); searching flat until the next ingest")
+            current = _load_sections(_get_chroma_client(version), path, name, vectors) if vectors is not None else None
+            if current is None:
+                _sections_cache.pop(tenant, None)
+                return None
+            _sections_cache[tenant] = current
+        return current
+
+
+def invalidate_sections():
+    _sections_cache.pop(current_tenant(), None)
+
+
+@on_tenant_evicted
+def _drop_tenant_sections(tenant: str):
+    _sections_cache.pop(tenant, None)
+
+
+def _flat_search(q: np.ndarray, k: int) -> List[Tuple[Document, float]]:
+    got = get_chroma_vectorstore()._collection.query(
+        query_embeddings=[q.tolist()], n_results=k, include=["documents", "metadatas", "distances"]
+    )
+    return [
+        (Document(page_content=text or "", metadata=md or {}), _relevance(float(dist)))
+        for text, md, dist in zip(got["documents"][0], got["metadatas"][0], got["distances"][0])
+    ]
+
+
+def hierarchical_search(query_vector: List[float], k: int, top_docs: Optional[int] = None) -> List[Tuple[Document, float]]:
+    q = np.asarray(query_vector, dtype=np.float32)
+    sections = _get_sections()
+    if sections is None:
+        return _flat_search(q, k)
+    if not sections.metas:
+        return []
+    n = min(top_docs or settings.hierarchy_top_docs, len(sections.metas))
+    # centroids are unit length, so the dot product ranks the same as cosine / l2
+    top = np.argpartition(-(sections.centroids @ q), n - 1)[:n]
+    ids = [cid for i in top for cid in json.loads(sections.metas[i].get("chunk_ids") or "[]")]
+    rows = np.sort(sections.vectors.rows(ids))
+    if not len(rows):
+        return []
+    sq_l2 = ((sections.vectors.read(rows) - q) ** 2).sum(axis=1)
+    best = np.argsort(sq_l2)[:k]
+    top_ids = [sections.vectors.ids[rows[i]] for i in best]
+    # documents and metadata come from SQLite; the result order is not the order asked for
+    got = get_chroma_vectorstore()._collection.get(ids=top_ids, include=["documents", "metadatas"])
+    found = {cid: (text, md) for cid, text, md in zip(got["ids"], got["documents"], got["metadatas"])}
+    return [
+        (Document(page_content=found[cid][0] or "", metadata=found[cid][1] or {}), _relevance(float(sq_l2[i])))
+        for cid, i in zip(top_ids, best)
+        if cid in found
+    ]
+
+
+class HierarchicalRetriever(BaseRetriever):
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query)]
+
+    def search_with_scores(self, query: str) -> List[Tuple[Document, float]]:
+        return hierarchical_search(get_embeddings().embed_query(query), self.k)
@@ -1,19 +1,74 @@
+import argparse
+import hashlib
+import json
+import logging
 import os
-from typing import Dict, Any
+import sys
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
 from app.config import settings
-from app.vectorstore import get_vectorstore, build_chroma_from_documents
+from app.vectorstore import (
+    get_vectorstore,
+    get_weaviate_client,
+    build_chroma_from_documents,
+    chroma_shard_count,
+    chroma_version_path,
+    live_chroma_version,
+    new_chroma_version,
+    publish_chroma_version,
+    reset_vectorstore,
+    _provider_suffix,
+)
 from app.rag.loaders import discover_pdfs, load_pdfs
-from app.rag.splitter import split_docs
+from app.tenancy import DEFAULT_TENANT, current_tenant, tenant_pdfs_dir, tenant_scope
+from app.rag.splitter import chunk_ids, split_docs
+from app.rag.dedup import dedup_chunks, dedup_passages
+from app.rag.weaviate_bulk import bulk_import_weaviate
+from app.rag.shadow import invalidate_shadow_index, shadow_enabled
+from app.rag.vector_file import export_vector_file
+from app.rag.hierarchy import build_doc_index, hierarchical_enabled
+from app.rag.sharded import build_shards_from_documents
 from langchain_chroma import Chroma
 
+logger = logging.getLogger(__name__)
 
-def index_docs(chunks, backend: str = "chroma") -> Dict[str, Any]:
+
+def _build_doc_index(version: Optional[str]) -> Dict[str, Any]:
+    # the chunks are already indexed: a failed section build only means flat search until the next one
+    try:
+        return build_doc_index(version)
+    except Exception as e:
+        logger.warning("Section index build failed: %s", e)
+        return {"error": str(e)}
+
+
+def _export_vector_file(version: Optional[str]) -> Dict[str, Any]:
+    # like the section index: without it the shadow and hierarchical modes search plain Chroma
+    try:
+        return export_vector_file(version)
+    except Exception as e:
+        logger.warning("Vector file export failed: %s", e)
+        return {"error": str(e)}
+
+
+def index_docs(chunks, backend: str = "chroma", version: Optional[str] = None) -> Dict[str, Any]:
     if not chunks:
         return {"chunks_indexed": 0, "status": "no_chunks"}
     debug = {}
     try:
+        if backend == "chroma" and chroma_shard_count(version) > 1:
+            # sections and the shadow index read one flat collection, so they are not built here
+            debug["sharding"] = build_shards_from_documents(chunks, version=version, ids=chunk_ids(chunks))
+            debug["persist_dir"] = chroma_version_path(version)
+            return {"chunks_indexed": len(chunks), "status": "ok", "backend": backend, "debug": debug}
         if backend == "chroma":
-            store = build_chroma_from_documents(chunks)
+            store = build_chroma_from_documents(chunks, version=version, ids=chunk_ids(chunks))
+            if hierarchical_enabled():
+                debug["doc_index"] = _build_doc_index(version)
+            if shadow_enabled() or hierarchical_enabled():
+                debug["vector_file"] = _export_vector_file(version)
+            invalidate_shadow_index()
             # diagnostics
             try:
                 collection = getattr(store, "_collection", None)
@@ -24,7 +79,7 @@ def index_docs(chunks, backend: str = "chroma") -> Dict[str, Any]:
                 debug["collection_error"] = str(e)
             # list persist dir contents
             try:
-                persist_dir = os.path.abspath(settings.chroma_persist_dir)
+                persist_dir = chroma_version_path(version)
                 listing = []
                 dir_listing = []
                 for root, dirs, files in os.walk(persist_dir):
@@ -38,6 +93,10 @@ def index_docs(chunks, backend: str = "chroma") -> Dict[str, Any]:
             except Exception as e:
                 debug = {"persist_dir": settings.chroma_persist_dir, "persist_error": str(e)}
             return {"chunks_indexed": len(chunks), "status": "ok", "backend": backend, "debug": debug}
+        elif backend == "weaviate":
+            stats = bulk_import_weaviate(chunks)
+            status = "ok" if not stats["failed"] else "partial"
+            return {"chunks_indexed": stats["imported"], "status": status, "backend": backend, "bulk": stats}
         else:
             vs = get_vectorstore(backend)
             vs.add_documents(chunks)
@@ -46,16 +105,322 @@ def index_docs(chunks, backend: str = "chroma") -> Dict[str, Any]:
         return {"chunks_indexed": 0, "status": "error", "error": str(e), "backend": backend}
 
 
-def ingest_all(backend: str = "chroma") -> Dict[str, Any]:
-    pdfs = discover_pdfs(settings.pdfs_dir)
+def split_and_dedup(docs) -> Tuple[list, list, Optional[Dict[str, Any]]]:
+    # repeated passages are cut from the pages before splitting, then near-duplicate chunks collapse
+    if not settings.dedup_chunks:
+        chunks = split_docs(docs)
+        return chunks, chunks, None
+    pages, passages = dedup_passages(docs)
+    chunks = split_docs(pages)
+    unique, report = dedup_chunks(chunks)
+    return chunks, unique, {**report, "passages": passages}
+
+
+def ingest_all(backend: str = "chroma", force_reset: bool = False) -> Dict[str, Any]:
+    pdfs = discover_pdfs(tenant_pdfs_dir())
     docs, errors = load_pdfs(pdfs)
-    chunks = split_docs(docs)
-    summary = index_docs(chunks, backend=backend)
+    chunks, unique, dedup_report = split_and_dedup(docs)
+    # Chroma reset = build into a fresh version and switch the alias only once it's complete
+    version = new_chroma_version() if (backend == "chroma" and force_reset) else None
+    summary = index_docs(unique, backend=backend, version=version)
+    if version is not None:
+        if summary.get("status") in ("ok", "no_chunks") and publish_chroma_version(version):
+            summary["published_version"] = version
+        else:
+            # failed build, or a newer rebuild published while this one ran
+            summary["unpublished_version"] = version
     summary.update({
         "files_indexed": len(pdfs),
         "documents_loaded": len(docs),
         "chunks_produced": len(chunks),
+        "dedup": dedup_report,
         "errors": errors,
     })
     return summary
 
+
+# Resumable CLI ingest. The corpus is split and deduped up front (cheap and deterministic), then
+# embedded file by file in batches of INGEST_BATCH_SIZE; a JSON checkpoint records finished
+# batches so a restarted run skips them. A force_reset Chroma ingest builds into a staging
+# version that is recorded in the checkpoint and published only after the last batch.
+#
+#   python -m app.rag.index --backend chroma --force-reset
+#   python -m app.rag.index --dry-run
+
+
+def _file_fingerprint(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _run_settings(backend: str, force_reset: bool, batch_size: int) -> Dict[str, Any]:
+    # anything that changes which chunks land in which batch invalidates a checkpoint
+    return {
+        "tenant": current_tenant(),
+        "backend": backend,
+        "provider": _provider_suffix(),
+        "force_reset": force_reset,
+        "batch_size": batch_size,
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap,
+        "dedup_chunks": settings.dedup_chunks,
+        "dedup_min_words": settings.dedup_min_words,
+        "dedup_max_distance": settings.dedup_max_distance,
+    }
+
+
+def _default_checkpoint() -> str:
+    tenant = current_tenant()
+    if tenant == DEFAULT_TENANT:
+        return settings.ingest_checkpoint
+    return os.path.join(settings.tenants_dir, tenant, "ingest_checkpoint.json")
+
+
+def _load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_checkpoint(path: str, state: Dict[str, Any]):
+    # write-then-rename so a crash mid-write leaves the previous checkpoint intact
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+_token_encoder: Any = None
+
+
+def _get_token_encoder():
+    # cl100k_base matches OpenAI's embedding models; False once known to be unavailable.
+    # Opt-in (TOKEN_ESTIMATE=tiktoken): the first get_encoding downloads the encoding file
+    # unless it is in tiktoken's cache, and offline that can hang a dry run.
+    global _token_encoder
+    if _token_encoder is None:
+        if (settings.token_estimate or "").lower() != "tiktoken":
+            return None
+        try:
+            import tiktoken
+            _token_encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoder = False
+    return _token_encoder or None
+
+
+def estimate_tokens(texts: List[str]) -> Dict[str, Any]:
+    enc = _get_token_encoder()
+    if enc is None:
+        return {"tokens": sum(len(t) for t in texts) // 4, "method": "chars/4"}
+    return {"tokens": sum(len(enc.encode(t)) for t in texts), "method": "cl100k_base"}
+
+
+def _plan(backend: str, force_reset: bool, batch_size: int) -> Dict[str, Any]:
+    pdfs = sorted(discover_pdfs(tenant_pdfs_dir()))
+    docs, errors = load_pdfs(pdfs)
+    chunks, unique, dedup_report = split_and_dedup(docs)
+    ids = chunk_ids(unique)
+    by_file: Dict[str, List[int]] = {p: [] for p in pdfs}
+    for i, c in enumerate(unique):
+        by_file.setdefault(str((c.metadata or {}).get("file")), []).append(i)
+    corpus = hashlib.sha1(json.dumps({p: _file_fingerprint(p) for p in pdfs}, sort_keys=True).encode()).hexdigest()
+    return {
+        "pdfs": pdfs,
+        "docs": docs,
+        "errors": errors,
+        "chunks": chunks,
+        "unique": unique,
+        "ids": ids,
+        "by_file": by_file,
+        "dedup": dedup_report,
+        "settings": {**_run_settings(backend, force_reset, batch_size), "corpus": corpus},
+    }
+
+
+def _resume_state(checkpoint_path: str, plan: Dict[str, Any], restart: bool) -> Optional[Dict[str, Any]]:
+    state = _load_checkpoint(checkpoint_path)
+    if state is None or restart:
+        return None
+    if state.get("settings") != plan["settings"]:
+        raise RuntimeError(
+            f"Checkpoint {checkpoint_path} was written for different settings or PDFs "
+            f"({state.get('settings')}); rerun with --restart to start over."
+        )
+    return state
+
+
+def ingest_resumable(
+    backend: str = "chroma",
+    force_reset: bool = False,
+    checkpoint_path: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    restart: bool = False,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    checkpoint_path = checkpoint_path or _default_checkpoint()
+    batch_size = max(1, batch_size or settings.ingest_batch_size)
+    plan = _plan(backend, force_reset, batch_size)
+    try:
+        state = _resume_state(checkpoint_path, plan, restart)
+    except RuntimeError as e:
+        return {"status": "error", "error": str(e), "backend": backend}
+    unique, ids = plan["unique"], plan["ids"]
+    done = (state or {}).get("files", {})
+
+    if dry_run:
+        files, remaining = [], []
+        for path, idx in plan["by_file"].items():
+            texts = [unique[i].page_content for i in idx]
+            skip = min(len(idx), done.get(path, {}).get("batches_done", 0) * batch_size)
+            remaining.extend(texts[skip:])
+            files.append({
+                "file": path,
+                "chunks": len(idx),
+                "batches": -(-len(idx) // batch_size),
+                "chunks_done": skip,
+                "est_tokens": estimate_tokens(texts)["tokens"],
+            })
+        total = estimate_tokens([c.page_content for c in unique])
+        return {
+            "status": "dry_run",
+            "backend": backend,
+            "files": files,
+            "chunks_produced": len(plan["chunks"]),
+            "chunks_to_embed": len(unique),
+            "chunks_remaining": len(remaining),
+            "est_tokens": total["tokens"],
+            "est_tokens_remaining": estimate_tokens(remaining)["tokens"],
+            "token_estimate": total["method"],
+            "resuming": state is not None,
+            "dedup": plan["dedup"],
+            "errors": plan["errors"],
+        }
+
+    if backend not in ("chroma", "weaviate"):
+        return {"status": "error", "error": f"unsupported backend: {backend}", "backend": backend}
+
+    if state is None:
+        state = {"settings": plan["settings"], "version": None, "reset_done": False, "files": {}, "failed": []}
+        if backend == "chroma":
+            # pin the target version so a resumed run keeps writing to the same place
+            state["version"] = new_chroma_version() if force_reset else live_chroma_version()
+        _save_checkpoint(checkpoint_path, state)
+    resumed = bool(state["files"])
+
+    version = state["version"]
+    sharded = backend == "chroma" and chroma_shard_count(version) > 1
+    if backend == "chroma" and version and not os.path.isdir(chroma_version_path(version)):
+        return {
+            "status": "error",
+            "error": f"Chroma version {version} from the checkpoint no longer exists; rerun with --restart.",
+            "backend": backend,
+        }
+    if backend == "weaviate" and force_reset and not state["reset_done"]:
+        reset_vectorstore("weaviate")
+        state["reset_done"] = True
+        _save_checkpoint(checkpoint_path, state)
+    # one client (and HTTP session) for every batch of the run
+    weaviate_client = get_weaviate_client() if backend == "weaviate" else None
+
+    start = time.perf_counter()
+    indexed = skipped = 0
+    for path, idx in plan["by_file"].items():
+        entry = state["files"].setdefault(path, {"fingerprint": _file_fingerprint(path), "batches_done": 0})
+        entry["batches"] = -(-len(idx) // batch_size)
+        for b in range(entry["batches"]):
+            batch = idx[b * batch_size:(b + 1) * batch_size]
+            if b < entry["batches_done"]:
+                skipped += len(batch)
+                continue
+            docs = [unique[i] for i in batch]
+            try:
+                if sharded:
+                    build_shards_from_documents(docs, version=version, ids=[ids[i] for i in batch])
+                elif backend == "chroma":
+                    build_chroma_from_documents(docs, version=version, ids=[ids[i] for i in batch])
+                else:
+                    stats = bulk_import_weaviate(docs, client=weaviate_client, ids=[ids[i] for i in batch])
+                    state["failed"].extend(stats["errors"])
+            except Exception as e:
+                # finished batches are already in the checkpoint; the next run resumes here
+                logger.error("batch %d/%d of %s failed: %s", b + 1, entry["batches"], path, e)
+                return {
+                    "status": "error",
+                    "error": str(e),
+                    "backend": backend,
+                    "file": path,
+                    "batch": b,
+                    "chunks_indexed": indexed,
+                    "checkpoint": checkpoint_path,
+                }
+            indexed += len(batch)
+            entry["batches_done"] = b + 1
+            _save_checkpoint(checkpoint_path, state)
+            logger.info("%s: batch %d/%d (%d chunks)", os.path.basename(path), b + 1, entry["batches"], len(batch))
+        entry["done"] = True
+        _save_checkpoint(checkpoint_path, state)
+
+    summary: Dict[str, Any] = {
+        "status": "ok" if not state["failed"] else "partial",
+        "backend": backend,
+        "chunks_indexed": indexed,
+        "chunks_skipped": skipped,
+        "resumed": resumed,
+        "seconds": round(time.perf_counter() - start, 3),
+        "files_indexed": len(plan["pdfs"]),
+        "documents_loaded": len(plan["docs"]),
+        "chunks_produced": len(plan["chunks"]),
+        "dedup": plan["dedup"],
+        "failed": state["failed"][:50],
+        "errors": plan["errors"],
+    }
+    if backend == "chroma":
+        if not sharded and hierarchical_enabled():
+            # into the staging version, so it is switched in together with the chunks
+            summary["doc_index"] = _build_doc_index(version)
+        if not sharded and (shadow_enabled() or hierarchical_enabled()):
+            summary["vector_file"] = _export_vector_file(version)
+        if force_reset:
+            key = "published_version" if publish_chroma_version(version) else "unpublished_version"
+            summary[key] = version
+        invalidate_shadow_index()
+    os.remove(checkpoint_path)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest PDFs with batch-level checkpoints; rerun to resume after a crash.")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "weaviate"])
+    parser.add_argument("--force-reset", action="store_true", help="rebuild the index instead of adding to it")
+    parser.add_argument("--batch-size", type=int, default=None, help=f"chunks per checkpointed batch (default {settings.ingest_batch_size})")
+    parser.add_argument("--checkpoint", default=None, help=f"checkpoint file (default {settings.ingest_checkpoint}, per tenant)")
+    parser.add_argument("--tenant", default=None, help="tenant namespace (default: the single-tenant layout)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="report chunks and estimated tokens without embedding")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        with tenant_scope(args.tenant):
+            summary = ingest_resumable(
+                backend=args.backend,
+                force_reset=args.force_reset,
+                checkpoint_path=args.checkpoint,
+                batch_size=args.batch_size,
+                restart=args.restart,
+                dry_run=args.dry_run,
+            )
+    except ValueError as e:
+        summary = {"status": "error", "error": str(e)}
+    print(json.dumps(summary, indent=2, default=str))
+    return 1 if summary.get("status") == "error" else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
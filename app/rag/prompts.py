@@ -1,4 +1,6 @@
+import json
 import os
+from typing import List
 
 SYSTEM_INSTRUCTIONS = (
     "You are a university assistant. Use only the provided context to answer. "
@@ -25,3 +27,62 @@ def build_prompt(question: str, context_docs):
     prompt = "\n\n".join(lines)
     return prompt, sources
 
+
+def _doc_ref(d):
+    md = getattr(d, "metadata", {}) or {}
+    file = md.get("file") or md.get("source") or "unknown"
+    page = md.get("page")
+    return file, page
+
+
+def format_context(docs) -> str:
+    lines: List[str] = []
+    for i, d in enumerate(docs, start=1):
+        file, page = _doc_ref(d)
+        page_str = str(page) if page is not None else "?"
+        content = d.page_content or ""
+        lines.append(f"[{i}] ({file} p.{page_str})\n{content}")
+    return "\n\n".join(lines)
+
+
+def build_system_prompt() -> str:
+    # Strengthen grounding rules
+    return (
+        SYSTEM_INSTRUCTIONS
+        + "\n\nRules: Answer ONLY using the provided context snippets. Do not invent details. "
+        + "If the answer cannot be derived from the context, respond: 'I don't have enough information.' "
+        + "Prefer quoting or paraphrasing the relevant lines. Be concise."
+    )
+
+
+def build_user_prompt(question: str, docs) -> str:
+    ctx = format_context(docs)
+    return (
+        "Use only the following context to answer the user's question. If the answer is not found, say you do not have enough information.\n\n"
+        f"Context:\n{ctx}\n\nQuestion:\n{question}"
+    )
+
+
+def citations_text(docs) -> str:
+    lines: List[str] = ["\n\nCitations:"]
+    for i, d in enumerate(docs, start=1):
+        file, page = _doc_ref(d)
+        page_str = str(page) if page is not None else "?"
+        lines.append(f"[{i}] {file} p.{page_str}")
+    return "\n".join(lines)
+
+
+def source_list(docs) -> List[dict]:
+    sources = []
+    for d in docs:
+        file, page = _doc_ref(d)
+        source = {"file": file, "page": page}
+        # chunks collapsed at ingest also cite the other places the same text appears
+        dupes = (getattr(d, "metadata", {}) or {}).get("duplicate_sources")
+        if dupes:
+            try:
+                source["also_in"] = [r for r in json.loads(dupes) if r != {"file": file, "page": page}]
+            except ValueError:
+                pass
+        sources.append(source)
+    return sources
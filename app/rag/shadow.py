@@ -0,0 +1,253 @@
+import logging
+import math
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.config import settings
+from app.rag.vector_file import VectorFile, load_vector_file, process_memory, vector_file_name
+from app.tenancy import current_tenant
+from app.vectorstore import get_chroma_vectorstore, get_embeddings, live_chroma_version, on_tenant_evicted
+
+logger = logging.getLogger(__name__)
+
+_PAGE = 5000
+# popcount of every byte value, for Hamming distance on packed binary codes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+# one shadow index per tenant, dropped when the tenant's store is evicted
+_shadows: Dict[str, "ShadowIndex"] = {}
+_shadow_lock = threading.Lock()
+_shadow_checked_at: Dict[str, float] = {}
+# appends to the live version (ingest without force_reset) rewrite its vector file; picked up this often
+_RECHECK_SECONDS = 30.0
+
+
+def _relevance(sq_l2: np.ndarray) -> np.ndarray:
+    # same scale as Chroma's default l2 relevance (1 - distance / sqrt(2)) so thresholds carry over
+    return 1.0 - sq_l2 / math.sqrt(2)
+
+
+class ShadowIndex:
+    # In-RAM first-stage index over the live Chroma collection. Only quantized codes are kept:
+    # int8 (per-row symmetric scale) or binary (sign bits). Candidates are rescored exactly with
+    # float32 vectors from the version's vector file (memory-mapped, see vector_file.py), never
+    # from Chroma's vector segment, which would load the whole HNSW index into this process.
+    # int8 candidates are ranked by approximate squared L2 (stored row norms), the same metric
+    # as the rescore, so unnormalized embeddings are not pre-filtered by a different ordering;
+    # binary codes can only approximate the angle. Chroma is asked only for documents/metadata.
+
+    def __init__(self, collection, vectors: VectorFile, mode: str, version: str):
+        self.collection = collection
+        self.vectors = vectors
+        self.mode = mode
+        self.version = version
+        self.ids: List[str] = vectors.ids
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.sq_norms: Optional[np.ndarray] = None
+        self.dim = vectors.dim
+        self.load_seconds = 0.0
+
+    def _quantize(self, vecs: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.mode == "binary":
+            return np.packbits(vecs > 0, axis=1), None
+        scales = np.abs(vecs).max(axis=1).astype(np.float32)
+        scales[scales == 0] = 1.0
+        codes = np.round(vecs / scales[:, None] * 127).astype(np.int8)
+        return codes, scales / 127
+
+    def load(self) -> "ShadowIndex":
+        start = time.perf_counter()
+        codes, scales, norms = [], [], []
+        # one page of float32 vectors is resident at a time
+        for _, vecs in self.vectors.pages(_PAGE):
+            c, s = self._quantize(vecs)
+            codes.append(c)
+            if s is not None:
+                scales.append(s)
+                norms.append((vecs ** 2).sum(axis=1))
+        if codes:
+            self.codes = np.concatenate(codes)
+            self.scales = np.concatenate(scales) if scales else None
+            self.sq_norms = np.concatenate(norms) if norms else None
+        self.load_seconds = time.perf_counter() - start
+        return self
+
+    def _candidates(self, q: np.ndarray, n: int) -> np.ndarray:
+        if self.mode == "binary":
+            qcode = np.packbits(q > 0)
+            score = -_POPCOUNT[np.bitwise_xor(self.codes, qcode)].sum(axis=1, dtype=np.int32)
+        else:
+            qmax = float(np.abs(q).max()) or 1.0
+            dot = (self.codes.astype(np.int32) @ np.round(q / qmax * 127).astype(np.int32)) * self.scales * (qmax / 127)
+            # -(|x|^2 - 2 q.x) orders rows like -|x - q|^2; |q|^2 is the same for every row
+            score = 2 * dot - self.sq_norms
+        n = min(n, len(self.ids))
+        return np.argpartition(-score, n - 1)[:n]
+
+    def _rescore(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # exact squared-L2 over the candidates' float32 rows; returns the top k rows and distances
+        rows = np.sort(self._candidates(q, k * settings.shadow_rescore_factor))
+        sq_l2 = ((self.vectors.read(rows) - q) ** 2).sum(axis=1)
+        top = np.argsort(sq_l2)[:k]
+        return rows[top], sq_l2[top]
+
+    def search(self, query_vector: List[float], k: int) -> List[Tuple[Document, float]]:
+        if self.codes is None or not self.ids:
+            return []
+        rows, sq_l2 = self._rescore(np.asarray(query_vector, dtype=np.float32), k)
+        ids = [self.ids[r] for r in rows]
+        # metadata segment only (sqlite); the result order is not the order asked for
+        got = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        found = {cid: (text, md) for cid, text, md in zip(got["ids"], got["documents"], got["metadatas"])}
+        return [
+            (Document(page_content=found[cid][0] or "", metadata=found[cid][1] or {}), float(rel))
+            for cid, rel in zip(ids, _relevance(sq_l2))
+            if cid in found
+        ]
+
+    def memory(self) -> Dict[str, Any]:
+        n = len(self.ids)
+        code_bytes = int(self.codes.nbytes if self.codes is not None else 0)
+        scale_bytes = int(self.scales.nbytes if self.scales is not None else 0)
+        scale_bytes += int(self.sq_norms.nbytes if self.sq_norms is not None else 0)
+        # the id list is resident too: the list's pointers plus each str object
+        id_bytes = sys.getsizeof(self.ids) + sum(sys.getsizeof(i) for i in self.ids)
+        return {
+            "mode": self.mode,
+            "vectors": n,
+            "dim": self.dim,
+            "bytes": code_bytes + scale_bytes,
+            "id_bytes": id_bytes,
+            "total_bytes": code_bytes + scale_bytes + id_bytes,
+            # float32 rescoring vectors are on disk, memory-mapped; only touched rows are paged in
+            "float32_bytes": self.vectors.nbytes,
+            "vector_file": self.vectors.name,
+            "compression": round(self.vectors.nbytes / (code_bytes + scale_bytes), 1) if code_bytes else None,
+            "load_seconds": round(self.load_seconds, 3),
+            "version": self.version or None,
+            # what the whole process holds, Chroma and everything else included
+            "process": process_memory(),
+        }
+
+    def recall_report(self, k: Optional[int] = None, sample: int = 50, queries: Optional[List[str]] = None) -> Dict[str, Any]:
+        # Compare against exact brute-force search over the vector file. Queries are held-out
+        # question texts (the evaluation golden set by default), embedded like a chat query;
+        # stored chunk vectors would find themselves and inflate recall.
+        k = k or settings.top_k
+        if not self.ids:
+            return {"recall": None, "queries": 0}
+        source = "golden set" if queries is None else "given"
+        if queries is None:
+            from app.rag.evaluate import DEFAULT_GOLDEN, load_golden
+
+            try:
+                queries = [g["question"] for g in load_golden(DEFAULT_GOLDEN)]
+            except (OSError, ValueError, KeyError) as e:
+                return {"recall": None, "queries": 0, "error": f"no held-out queries: {e}"}
+        queries = queries[:sample]
+        if not queries:
+            return {"recall": None, "queries": 0}
+        embeddings = get_embeddings()
+        qvecs = np.asarray([embeddings.embed_query(q) for q in queries], dtype=np.float32)
+
+        t0 = time.perf_counter()
+        dists = [
+            (qvecs ** 2).sum(axis=1)[:, None] - 2 * qvecs @ vecs.T + (vecs ** 2).sum(axis=1)[None, :]
+            for _, vecs in self.vectors.pages(_PAGE)
+        ]
+        exact = np.concatenate(dists, axis=1)
+        exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+        hits = 0
+        t0 = time.perf_counter()
+        for qi, q in enumerate(qvecs):
+            truth = set(np.argsort(exact[qi])[:k].tolist())
+            rows, _ = self._rescore(q, k)
+            hits += len(truth & set(rows.tolist()))
+        shadow_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        return {
+            "k": k,
+            "queries": len(queries),
+            "query_source": source,
+            "recall": round(hits / (k * len(queries)), 4),
+            "shadow_ms_per_query": round(shadow_ms, 3),
+            "exact_ms_per_query": round(exact_ms, 3),
+        }
+
+
+def shadow_enabled() -> bool:
+    return (settings.shadow_index or "").lower() in ("int8", "binary")
+
+
+def load_shadow_index() -> Optional[ShadowIndex]:
+    if not shadow_enabled():
+        return None
+    mode = settings.shadow_index.lower()
+    tenant = current_tenant()
+    with _shadow_lock:
+        version = live_chroma_version()
+        name = vector_file_name(version)
+        shadow = _shadows.get(tenant)
+        if shadow is None or shadow.version != version or shadow.mode != mode or shadow.vectors.name != name:
+            if name is None:
+                # built before SHADOW_INDEX was set (or by a path that skips the export)
+                logger.warning("No vector file for Chroma version %r; re-ingest to enable the shadow index", version)
+                _shadows.pop(tenant, None)
+                return None
+            # built fully before being swapped in, so concurrent searches use the old one meanwhile
+            collection = get_chroma_vectorstore()._collection
+            shadow = _shadows[tenant] = ShadowIndex(collection, load_vector_file(version), mode, version).load()
+        return shadow
+
+
+def get_shadow_index() -> Optional[ShadowIndex]:
+    # cheap when current; reloads after a new Chroma version is published or its vector file
+    # is rewritten (an ingest that appended to the live version)
+    tenant = current_tenant()
+    shadow = _shadows.get(tenant)
+    if shadow is not None and shadow.version == live_chroma_version() and shadow.mode == (settings.shadow_index or "").lower():
+        now = time.monotonic()
+        if now - _shadow_checked_at.get(tenant, 0.0) < _RECHECK_SECONDS:
+            return shadow
+        _shadow_checked_at[tenant] = now
+        if vector_file_name(shadow.version) == shadow.vectors.name:
+            return shadow
+    return load_shadow_index()
+
+
+def invalidate_shadow_index():
+    _shadow_checked_at.pop(current_tenant(), None)
+
+
+@on_tenant_evicted
+def _drop_tenant_shadow(tenant: str):
+    # runs under the store lock: plain dict pops only, no locks taken here
+    _shadows.pop(tenant, None)
+    _shadow_checked_at.pop(tenant, None)
+
+
+def shadow_stats() -> Optional[Dict[str, Any]]:
+    # every tenant with a shadow index loaded in this worker, by tenant
+    shadows = dict(_shadows)
+    return {tenant: shadow.memory() for tenant, shadow in shadows.items()} or None
+
+
+class ShadowRetriever(BaseRetriever):
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query)]
+
+    def search_with_scores(self, query: str) -> List[Tuple[Document, float]]:
+        index = get_shadow_index()
+        if index is None:
+            # no vector file for this version yet: plain Chroma search until the next ingest
+            raw = get_chroma_vectorstore().similarity_search_with_score(query, k=self.k)
+            return [(doc, float(_relevance(score))) for doc, score in raw]
+        return index.search(get_embeddings().embed_query(query), self.k)
@@ -0,0 +1,143 @@
+import hashlib
+import heapq
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from chromadb.segment import MetadataReader, VectorReader
+from chromadb.types import VectorQuery
+from app.config import settings
+from app.vectorstore import (
+    chroma_lease,
+    chroma_version_written,
+    get_chroma_shard_collections,
+    get_embeddings,
+    open_chroma_shards,
+)
+
+# Sharded Chroma (CHROMA_SHARDS > 1). Chunks are partitioned by file across N collections, each
+# with its own PersistentClient (and so its own SQLite file and HNSW index) under shard-<i>/ in
+# the version directory. Ingest embeds and writes the shards in parallel. A query is embedded
+# once and searched against each shard's HNSW segment directly, skipping Chroma's query API
+# (validation, telemetry, metadata hydration), which cost several times the search itself. The
+# per-shard top-k lists are merged, and documents and metadata are read only for the global
+# top-k, from the shards that hold them. hnswlib releases the GIL while searching, so with more
+# than one CPU the shard searches run on the pool; on one CPU threads only add overhead.
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=settings.chroma_shard_workers or None, thread_name_prefix="chroma-shard")
+    return _pool
+
+
+def _relevance(sq_l2: float) -> float:
+    # same scale as Chroma's default l2 relevance, so cutoffs apply unchanged
+    return 1.0 - sq_l2 / math.sqrt(2)
+
+
+def shard_of(doc: Document, shards: int) -> int:
+    # by file, so every chunk of a PDF (and every re-ingest of it) lands in the same shard
+    md = doc.metadata or {}
+    key = str(md.get("file") or md.get("source") or "")
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:8], 16) % shards
+
+
+def build_shards_from_documents(docs: List[Document], version: Optional[str] = None, ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    with chroma_lease():
+        return _build_shards(docs, version, ids)
+
+
+def _build_shards(docs: List[Document], version: Optional[str], ids: Optional[List[str]]) -> Dict[str, Any]:
+    collections = get_chroma_shard_collections(version, create=True)
+    parts: Dict[int, List[int]] = {}
+    for i, doc in enumerate(docs):
+        parts.setdefault(shard_of(doc, len(collections)), []).append(i)
+    embeddings = get_embeddings()
+
+    def _write(shard: int, rows: List[int]):
+        texts = [docs[i].page_content for i in rows]
+        # ids make this an upsert, as in build_chroma_from_documents
+        collections[shard].upsert(
+            ids=[ids[i] for i in rows] if ids else [f"{shard}-{i}" for i in rows],
+            embeddings=embeddings.embed_documents(texts),
+            metadatas=[docs[i].metadata or None for i in rows],
+            documents=texts,
+        )
+
+    # list() re-raises the first shard error here
+    list(_get_pool().map(lambda item: _write(*item), parts.items()))
+    chroma_version_written(version)
+    return {"shards": len(collections), "chunks_per_shard": [len(parts.get(i, [])) for i in range(len(collections))]}
+
+
+def _fan_out() -> bool:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return cpus > 1
+
+
+def _segments(collection):
+    # shards are always embedded (PersistentClient), so the collection's segments are local
+    manager = collection._client._manager
+    return manager.get_segment(collection.id, VectorReader), manager.get_segment(collection.id, MetadataReader)
+
+
+def _knn_shard(segments, vector: List[float], k: int) -> List[Tuple[float, str]]:
+    vectors, _ = segments
+    if not vectors.count(None):
+        return []
+    query = VectorQuery(vectors=[vector], k=k, allowed_ids=None, include_embeddings=False, options=None, request_version_context=None)
+    return [(_relevance(r["distance"]), r["id"]) for r in vectors.query_vectors(query)[0]]
+
+
+def _hydrate(segments, ids: List[str]) -> Dict[str, Document]:
+    _, metadata = segments
+    docs = {}
+    for record in metadata.get_metadata(request_version_context=None, ids=ids, include_metadata=True):
+        md = dict(record["metadata"] or {})
+        text = md.pop("chroma:document", None)
+        md.pop("chroma:uri", None)
+        docs[record["id"]] = Document(page_content=text or "", metadata=md)
+    return docs
+
+
+def sharded_search(query_vector: List[float], k: int) -> List[Tuple[Document, float]]:
+    segments = [_segments(c) for c in get_chroma_shard_collections()]
+    run = _get_pool().map if _fan_out() else map
+    results = list(run(lambda s: _knn_shard(s, query_vector, k), segments))
+    # each shard's list is already its own top-k, so the global top-k is among them
+    top = heapq.nlargest(k, ((score, cid, i) for i, hits in enumerate(results) for score, cid in hits))
+    docs: Dict[str, Document] = {}
+    for i in sorted({i for _, _, i in top}):
+        docs.update(_hydrate(segments[i], [cid for _, cid, shard in top if shard == i]))
+    return [(docs[cid], score) for score, cid, _ in top if cid in docs]
+
+
+def shard_stats() -> Optional[Dict[str, Any]]:
+    # shards already open in this worker, by tenant; /health must not open or evict anything
+    stats = {}
+    for tenant, collections in open_chroma_shards().items():
+        try:
+            stats[tenant] = {"shards": len(collections), "chunks_per_shard": [c.count() for c in collections]}
+        except Exception as e:
+            stats[tenant] = {"error": str(e)}
+    return stats or None
+
+
+class ShardedRetriever(BaseRetriever):
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query)]
+
+    def search_with_scores(self, query: str) -> List[Tuple[Document, float]]:
+        return sharded_search(get_embeddings().embed_query(query), self.k)
@@ -1,3 +1,5 @@
+import uuid
+from typing import Dict, List
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from app.config import settings
 
@@ -13,3 +15,15 @@ def split_docs(docs):
     chunks = splitter.split_documents(docs)
     return [c for c in chunks if c.page_content and c.page_content.strip()]
 
+
+def chunk_ids(chunks) -> List[str]:
+    # deterministic ids (source, page, text, occurrence) so re-adding a chunk is an upsert
+    seen: Dict[str, int] = {}
+    ids = []
+    for c in chunks:
+        md = getattr(c, "metadata", {}) or {}
+        key = f"{md.get('file') or md.get('source')}:{md.get('page')}:{c.page_content}"
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        ids.append(str(uuid.uuid5(uuid.NAMESPACE_URL, f"{key}:{n}")))
+    return ids
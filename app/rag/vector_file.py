@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from app.vectorstore import _chroma_collection_name, _get_chroma_client, chroma_version_path
+
+# Float32 copy of a Chroma version's chunk vectors, for exact rescoring outside Chroma. Reading
+# embeddings back through Chroma (get(include=["embeddings"])) loads the collection's whole HNSW
+# segment, vectors and graph, into the process; rescoring from this file instead keeps the
+# first stage's RAM savings real. vectors.npy holds one row per chunk and ids.json the chunk id
+# of each row. Queries memory-map it, so only the rows they touch are paged in (as clean,
+# reclaimable page cache).
+#
+# Ingest writes it into the version it just built, under a unique vectors-<hex>/ directory, and
+# switches the VECTORS file in the version dir to it (atomically, like CURRENT and DOC_INDEX).
+
+logger = logging.getLogger(__name__)
+
+_PAGE = 5000
+_VECTORS_FILE = "VECTORS"
+_DIR_PREFIX = "vectors-"
+_MATRIX = "vectors.npy"
+_IDS = "ids.json"
+
+
+def vector_file_name(version: Optional[str] = None) -> Optional[str]:
+    # name of the version's current vector file directory, None if it was never written
+    try:
+        with open(os.path.join(chroma_version_path(version), _VECTORS_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _switch_vector_file(version: Optional[str], name: str):
+    root = chroma_version_path(version)
+    previous = vector_file_name(version)
+    pointer = os.path.join(root, _VECTORS_FILE)
+    tmp = f"{pointer}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, pointer)
+    # the replaced file stays for readers still mapping it; anything older goes
+    for other in os.listdir(root):
+        if other.startswith(_DIR_PREFIX) and other not in (name, previous):
+            shutil.rmtree(os.path.join(root, other), ignore_errors=True)
+
+
+def export_vector_file(version: Optional[str] = None) -> Dict[str, Any]:
+    # Copy the version's chunk vectors out of Chroma. Runs at ingest, in the process that just
+    # wrote the collection, so the HNSW segment it reads is already loaded there.
+    start = time.perf_counter()
+    collection = _get_chroma_client(version).get_or_create_collection(_chroma_collection_name())
+    total = collection.count()
+    name = f"{_DIR_PREFIX}{uuid.uuid4().hex[:8]}"
+    path = os.path.join(chroma_version_path(version), name)
+    os.makedirs(path)
+    ids: List[str] = []
+    matrix = None
+    offset = 0
+    while offset < total:
+        page = collection.get(include=["embeddings"], limit=_PAGE, offset=offset)
+        if not page.get("ids"):
+            break
+        vecs = np.asarray(page["embeddings"], dtype=np.float32)
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(os.path.join(path, _MATRIX), mode="w+", dtype=np.float32, shape=(total, vecs.shape[1]))
+        matrix[offset:offset + len(vecs)] = vecs
+        ids.extend(page["ids"])
+        offset += len(vecs)
+    if offset != total:
+        shutil.rmtree(path, ignore_errors=True)
+        raise RuntimeError(f"collection changed during vector export ({offset} of {total} rows read)")
+    dim = 0
+    if matrix is None:
+        np.save(os.path.join(path, _MATRIX), np.zeros((0, 0), dtype=np.float32))
+    else:
+        dim = matrix.shape[1]
+        matrix.flush()
+        del matrix
+    with open(os.path.join(path, _IDS), "w") as f:
+        json.dump(ids, f)
+    _switch_vector_file(version, name)
+    return {
+        "vectors": len(ids),
+        "dim": dim,
+        "bytes": os.path.getsize(os.path.join(path, _MATRIX)),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+class VectorFile:
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, _IDS)) as f:
+            self.ids: List[str] = json.load(f)
+        self.matrix = self._open()
+        self._rows: Optional[Dict[str, int]] = None
+
+    def _open(self) -> np.ndarray:
+        if not self.ids:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.load(os.path.join(self.path, _MATRIX), mmap_mode="r")
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0
+
+    @property
+    def nbytes(self) -> int:
+        return os.path.getsize(os.path.join(self.path, _MATRIX))
+
+    def pages(self, size: int = _PAGE) -> Iterator[Tuple[int, np.ndarray]]:
+        # full scans go through a mapping of their own that is dropped afterwards, so the pages
+        # they read don't stay in this process's RSS (only in the kernel's page cache)
+        matrix = self._open()
+        try:
+            for offset in range(0, len(self.ids), size):
+                yield offset, np.array(matrix[offset:offset + size])
+        finally:
+            del matrix
+
+    def rows(self, ids: List[str]) -> np.ndarray:
+        # row of each chunk id (ids not in the file are skipped)
+        if self._rows is None:
+            self._rows = {cid: row for row, cid in enumerate(self.ids)}
+        return np.asarray([self._rows[cid] for cid in ids if cid in self._rows], dtype=np.int64)
+
+    def read(self, rows: np.ndarray) -> np.ndarray:
+        # rows must be sorted, so the reads go through the file front to back
+        return np.asarray(self.matrix[rows], dtype=np.float32)
+
+
+def load_vector_file(version: Optional[str] = None) -> Optional[VectorFile]:
+    name = vector_file_name(version)
+    if name is None:
+        return None
+    return VectorFile(os.path.join(chroma_version_path(version), name))
+
+
+def process_memory() -> Dict[str, Optional[int]]:
+    # resident set of this process, split into anonymous memory (heap, numpy arrays, a loaded
+    # HNSW index) and file-backed pages (memory-mapped vector files; the kernel can drop these)
+    out: Dict[str, Optional[int]] = {"rss_bytes": None, "rss_anon_bytes": None, "rss_file_bytes": None}
+    keys = {"VmRSS": "rss_bytes", "RssAnon": "rss_anon_bytes", "RssFile": "rss_file_bytes"}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in keys:
+                    out[keys[key]] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return out
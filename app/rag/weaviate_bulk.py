@@ -0,0 +1,92 @@
+import time
+from typing import Any, Dict, List, Optional, Set
+from weaviate.batch.crud_batch import WeaviateErrorRetryConf
+from app.config import settings
+from app.rag.splitter import chunk_ids
+from app.vectorstore import get_embeddings, get_weaviate_client, _weaviate_class_name
+
+
+def _object_properties(doc) -> Dict[str, Any]:
+    # same shape the LangChain Weaviate wrapper writes: text_key + flat metadata
+    props: Dict[str, Any] = {"text": doc.page_content}
+    for key, value in (getattr(doc, "metadata", {}) or {}).items():
+        if isinstance(value, (str, int, float, bool)) and key.isidentifier():
+            props[key] = value
+    return props
+
+
+def bulk_import_weaviate(
+    chunks,
+    client=None,
+    class_name: Optional[str] = None,
+    embeddings=None,
+    ids: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    # same deterministic ids as Chroma, so retried/re-run imports overwrite instead of duplicating
+    ids = ids or chunk_ids(chunks)
+    client = client or get_weaviate_client()
+    class_name = class_name or _weaviate_class_name()
+    embeddings = embeddings or get_embeddings()
+    batch_size = max(1, settings.weaviate_batch_size)
+
+    errors: List[Dict[str, Any]] = []
+    # the callback can report an object again after a retry; count each failed id once
+    failed_ids: Set[str] = set()
+    sent: Dict[str, Dict[str, Any]] = {}
+
+    def _collect(results):
+        # called per server batch after the client's own per-object retries are exhausted
+        for r in results or []:
+            errs = ((r.get("result") or {}).get("errors") or {}).get("error") or []
+            if errs:
+                obj_id = r.get("id")
+                if obj_id in failed_ids:
+                    continue
+                failed_ids.add(obj_id)
+                ref = sent.get(obj_id, {})
+                errors.append({
+                    "id": obj_id,
+                    "file": ref.get("file"),
+                    "page": ref.get("page"),
+                    "error": "; ".join(str(e.get("message")) for e in errs),
+                })
+
+    client.batch.configure(
+        batch_size=batch_size,
+        dynamic=True,
+        num_workers=max(1, settings.weaviate_batch_workers),
+        timeout_retries=settings.weaviate_batch_retries,
+        connection_error_retries=settings.weaviate_batch_retries,
+        weaviate_error_retries=WeaviateErrorRetryConf(number_retries=max(1, settings.weaviate_batch_retries)),
+        callback=_collect,
+    )
+
+    start = time.perf_counter()
+    embed_seconds = 0.0
+    with client.batch as batch:
+        for i in range(0, len(chunks), batch_size):
+            part = chunks[i:i + batch_size]
+            # a full batch is handed to the client's worker threads and embedding goes on, but
+            # every num_workers batches the client waits for all uploads in flight; with one
+            # worker, embedding and uploading simply alternate
+            t0 = time.perf_counter()
+            vectors = embeddings.embed_documents([c.page_content for c in part])
+            embed_seconds += time.perf_counter() - t0
+            for doc, vector, obj_id in zip(part, vectors, ids[i:i + batch_size]):
+                props = _object_properties(doc)
+                sent[obj_id] = {"file": props.get("file"), "page": props.get("page")}
+                batch.add_data_object(props, class_name, uuid=obj_id, vector=vector)
+    elapsed = time.perf_counter() - start
+
+    imported = len(sent) - len(failed_ids)
+    return {
+        "objects": len(sent),
+        "imported": imported,
+        "failed": len(failed_ids),
+        "errors": errors[:50],
+        "seconds": round(elapsed, 3),
+        "embed_seconds": round(embed_seconds, 3),
+        "objects_per_sec": round(imported / elapsed, 1) if elapsed > 0 else None,
+        "batch_size": batch_size,
+        "workers": max(1, settings.weaviate_batch_workers),
+    }
@@ -0,0 +1,50 @@
+import contextlib
+import os
+import re
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from app.config import settings
+
+# Tenant namespaces. The tenant of the current request lives in a context variable set at the
+# API boundary (tenant_scope); path and collection-name helpers read it, and it follows the
+# request into threadpool calls and tasks. The default tenant keeps the original single-tenant
+# layout (PDFS_DIR, CHROMA_PERSIST_DIR); other tenants live under TENANTS_DIR/<tenant>/.
+
+DEFAULT_TENANT = "default"
+_TENANT_RE = re.compile(r"^[a-z0-9][a-z0-9_]{0,47}$")
+_current: ContextVar[str] = ContextVar("tenant", default=DEFAULT_TENANT)
+
+
+def normalize_tenant(tenant: Optional[str]) -> str:
+    tenant = (tenant or "").strip().lower() or DEFAULT_TENANT
+    if not _TENANT_RE.match(tenant):
+        # also keeps tenant ids safe as directory names and Weaviate class suffixes
+        raise ValueError("Invalid tenant: use 1-48 lowercase letters, digits or underscores.")
+    return tenant
+
+
+def current_tenant() -> str:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def tenant_scope(tenant: Optional[str]) -> Iterator[str]:
+    token = _current.set(normalize_tenant(tenant))
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def _tenant_root(tenant: str) -> str:
+    return os.path.join(settings.tenants_dir, tenant)
+
+
+def tenant_pdfs_dir(tenant: Optional[str] = None) -> str:
+    tenant = tenant or current_tenant()
+    return settings.pdfs_dir if tenant == DEFAULT_TENANT else os.path.join(_tenant_root(tenant), "pdfs")
+
+
+def tenant_chroma_dir(tenant: Optional[str] = None) -> str:
+    tenant = tenant or current_tenant()
+    return settings.chroma_persist_dir if tenant == DEFAULT_TENANT else os.path.join(_tenant_root(tenant), "chroma")
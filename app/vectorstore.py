@@ -1,9 +1,18 @@
-from typing import Optional, Literal, List
+from collections import OrderedDict
+from typing import Any, Callable, Iterator, Optional, Literal, List, Dict, Set
+import contextlib
+import logging
 import os
 import shutil
+import threading
+import time
+import uuid
 from langchain_chroma import Chroma
 import chromadb
-from chromadb.config import Settings as ChromaSettings
+from chromadb.api import ServerAPI
+from chromadb.api.client import Client as ChromaClient
+from chromadb.config import Settings as ChromaSettings, System as ChromaSystem
+from chromadb.telemetry.product import ProductTelemetryClient
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain_community.vectorstores import Weaviate
@@ -11,16 +20,54 @@ import weaviate
 from app.config import settings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_core.documents import Document
+from app.rag.embeddings import HashEmbeddings, OnnxEmbeddings
+from app.tenancy import DEFAULT_TENANT, current_tenant, tenant_chroma_dir
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; publishes there are only serialized within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 _embeddings: Optional[object] = None
-_vectorstore_chroma: Optional[Chroma] = None
-_vectorstore_weaviate: Optional[Weaviate] = None
-_chroma_client: Optional[chromadb.ClientAPI] = None
+_chroma_clients: Dict[str, chromadb.ClientAPI] = {}
+# the Chroma System behind each client, held here so releasing a path can stop it
+_chroma_systems: Dict[str, ChromaSystem] = {}
+# Open Chroma stores per tenant, least recently used first: {"version", "store", "bytes", "root"}
+_chroma_stores: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_stores_lock = threading.RLock()
+# Tenants with queries/writes in flight (refcounts), and live clients whose close an eviction
+# deferred until the last of them finishes
+_tenant_users: Dict[str, int] = {}
+_deferred_close: Dict[str, Set[str]] = {}
+# estimated bytes per client path, computed once per version (writes to it invalidate)
+_store_bytes: Dict[str, int] = {}
+_weaviate_stores: Dict[str, Weaviate] = {}
+# per-tenant caches elsewhere (shadow index, hierarchy sections) register here to be dropped on eviction
+_eviction_hooks: List[Callable[[str], None]] = []
+# rough in-memory cost of an open tenant: Chroma system + sqlite, and per-vector HNSW links (M=16)
+_TENANT_BASE_BYTES = 8 * 1024 * 1024
+_HNSW_LINK_BYTES = 2 * 16 * 4
+
+# Blue/green layout: each index build goes into its own version directory under the
+# persist dir, and CURRENT names the live one. An empty/missing CURRENT means the
+# legacy layout where the collection lives directly in the persist dir.
+_CURRENT_FILE = "CURRENT"
+# held (flock) while CURRENT is compared and switched, so concurrent publishes are serialized
+_PUBLISH_LOCK_FILE = "CURRENT.lock"
+_publish_lock = threading.Lock()
+_VERSION_PREFIX = "v-"
+# Sharded versions hold one PersistentClient per shard in shard-<i>/, and SHARDS records how many
+_SHARDS_FILE = "SHARDS"
+_SHARD_PREFIX = "shard-"
+# Stamped into a version when it stops being live; GC waits CHROMA_GC_GRACE_S from this point
+_RETIRED_FILE = "RETIRED"
 
 
 def _provider_suffix() -> str:
     prov = (settings.embeddings_provider or "openai").lower()
-    if prov in ("openai", "ollama", "gemini"):
+    if prov in ("openai", "ollama", "gemini", "hash", "onnx"):
         return prov
     return "openai"
 
@@ -30,8 +77,10 @@ def _chroma_collection_name() -> str:
 
 
 def _weaviate_class_name() -> str:
-    m = {"openai": "OpenAI", "ollama": "Ollama", "gemini": "Gemini"}
-    return f"UniversityDoc{m.get(_provider_suffix(), 'OpenAI')}"
+    m = {"openai": "OpenAI", "ollama": "Ollama", "gemini": "Gemini", "hash": "Hash", "onnx": "Onnx"}
+    name = f"UniversityDoc{m.get(_provider_suffix(), 'OpenAI')}"
+    tenant = current_tenant()
+    return name if tenant == DEFAULT_TENANT else f"{name}_{tenant}"
 
 
 def get_embeddings():
@@ -40,7 +89,19 @@ def get_embeddings():
         return _embeddings
 
     provider = (settings.embeddings_provider or "openai").lower()
-    if provider == "ollama":
+    if provider == "hash":
+        # deterministic offline embeddings (evaluation, tests, no network)
+        _embeddings = HashEmbeddings(dim=settings.hash_embed_dim)
+    elif provider == "onnx":
+        # local CPU inference, no network after the model is on disk
+        _embeddings = OnnxEmbeddings(
+            model_dir=settings.onnx_model_dir or None,
+            batch_size=settings.onnx_batch_size,
+            threads=settings.onnx_threads,
+            max_length=settings.onnx_max_length,
+            cache_size=settings.onnx_token_cache,
+        )
+    elif provider == "ollama":
         _embeddings = OllamaEmbeddings(
             model=settings.ollama_embed_model,
             base_url=settings.ollama_host,
@@ -66,12 +127,11 @@ def get_embeddings():
 
 
 def _persist_path() -> str:
-    # Use absolute path to avoid environment-dependent resolution
-    return os.path.abspath(settings.chroma_persist_dir)
+    # Use absolute path to avoid environment-dependent resolution; one root per tenant
+    return os.path.abspath(tenant_chroma_dir())
 
 
-def _ensure_persist_dir():
-    path = _persist_path()
+def _ensure_dir_writable(path: str):
     os.makedirs(path, exist_ok=True)
     try:
         # set liberal permissions for local dev
@@ -84,59 +144,464 @@ def _ensure_persist_dir():
         raise RuntimeError(f"Chroma persist dir not writable: {path} ({e})")
 
 
-def _get_chroma_client():
-    global _chroma_client
-    if _chroma_client is None:
-        _ensure_persist_dir()
+def _ensure_persist_dir():
+    _ensure_dir_writable(_persist_path())
+
+
+def live_chroma_version() -> str:
+    try:
+        with open(os.path.join(_persist_path(), _CURRENT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def chroma_version_path(version: Optional[str] = None) -> str:
+    version = live_chroma_version() if version is None else version
+    return os.path.join(_persist_path(), version) if version else _persist_path()
+
+
+def new_chroma_version() -> str:
+    # sortable by creation time; the random suffix keeps concurrent builders apart
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now))
+    version = f"{_VERSION_PREFIX}{stamp}-{int(now * 1e6) % 1000000:06d}-{uuid.uuid4().hex[:6]}"
+    _ensure_dir_writable(chroma_version_path(version))
+    return version
+
+
+def _open_chroma_client(path: str) -> chromadb.ClientAPI:
+    # Same setup as chromadb.PersistentClient, but we keep the System so it can be stopped later
+    system = ChromaSystem(ChromaSettings(is_persistent=True, persist_directory=path))
+    system.instance(ProductTelemetryClient)
+    system.instance(ServerAPI)
+    system.start()
+    try:
+        client = ChromaClient.from_system(system)
+    except Exception:
+        system.stop()
+        raise
+    _chroma_clients[path] = client
+    _chroma_systems[path] = system
+    return client
+
+
+def _release_chroma_client(path: str):
+    # Drop our handle and stop its Chroma system so its files/memory are freed
+    _chroma_clients.pop(path, None)
+    system = _chroma_systems.pop(path, None)
+    if system is not None:
         try:
-            _chroma_client = chromadb.PersistentClient(path=_persist_path())
+            system.stop()
         except Exception:
-            # Attempt a reset if the client fails to initialize (e.g., readonly sqlite)
-            try:
-                shutil.rmtree(_persist_path(), ignore_errors=True)
-                _ensure_persist_dir()
-                _chroma_client = chromadb.PersistentClient(path=_persist_path())
-            except Exception as e2:
-                raise RuntimeError(f"Failed to initialize Chroma PersistentClient at {_persist_path()}: {e2}")
-    return _chroma_client
+            pass
+
+
+def _release_chroma_clients_under(path: str):
+    # the version is being deleted: drop its clients and cached size
+    for p in list(_chroma_clients) + list(_store_bytes):
+        if p == path or p.startswith(path + os.sep):
+            _release_chroma_client(p)
+            _store_bytes.pop(p, None)
+
+
+def _get_chroma_client(version: Optional[str] = None, shard: Optional[int] = None):
+    version = live_chroma_version() if version is None else version
+    path = chroma_version_path(version)
+    if shard is not None:
+        path = os.path.join(path, f"{_SHARD_PREFIX}{shard}")
+    client = _chroma_clients.get(path)
+    if client is not None:
+        return client
+    # opening is also the read path, so no write probe here (new_chroma_version checks writability)
+    os.makedirs(path, exist_ok=True)
+    try:
+        client = _open_chroma_client(path)
+    except Exception as e:
+        if version == live_chroma_version():
+            # never wipe the live index; other requests/workers may be reading it
+            raise RuntimeError(f"Failed to initialize Chroma PersistentClient at {path}: {e}")
+        # Attempt a reset if a staging client fails to initialize (e.g., readonly sqlite)
+        try:
+            _release_chroma_client(path)
+            shutil.rmtree(path, ignore_errors=True)
+            _ensure_dir_writable(path)
+            client = _open_chroma_client(path)
+        except Exception as e2:
+            raise RuntimeError(f"Failed to initialize Chroma PersistentClient at {path}: {e2}")
+    return client
+
+
+def _release_stale_chroma_clients():
+    # versions garbage-collected by another worker: close our handles to them
+    for path in list(_chroma_clients):
+        if not os.path.isdir(path):
+            _release_chroma_client(path)
+
+
+def _client_path(client: chromadb.ClientAPI) -> Optional[str]:
+    return next((p for p, c in _chroma_clients.items() if c is client), None)
+
+
+def _hnsw_disk_bytes(path: str) -> int:
+    # HNSW segment files (vectors, graph links, id maps) in the client's own segment directories
+    total = 0
+    for name in os.listdir(path):
+        seg = os.path.join(path, name)
+        if _is_uuid(name) and os.path.isdir(seg):
+            total += sum(os.path.getsize(os.path.join(seg, f)) for f in os.listdir(seg))
+    return total
+
+
+def _estimate_store_bytes(path: Optional[str], collection) -> int:
+    # A queried collection's HNSW segment is loaded whole: every vector plus its graph links.
+    # Sized from the segment files on disk; reading a vector back to learn the dimension would
+    # load the segment just to measure it.
+    if path in _store_bytes:
+        return _store_bytes[path]
+    try:
+        n = collection.count()
+        if not n:
+            return _TENANT_BASE_BYTES
+        # recent writes may not be flushed to the segment files yet
+        est = _TENANT_BASE_BYTES + max(_hnsw_disk_bytes(path) if path else 0, n * _HNSW_LINK_BYTES)
+    except Exception:
+        return _TENANT_BASE_BYTES
+    if path is not None:
+        _store_bytes[path] = est
+    return est
+
+
+def _version_client_paths(version_path: str) -> List[str]:
+    # the version's own client plus its shard clients, not other versions nested under the root
+    return [
+        p for p in _chroma_clients
+        if p == version_path
+        or (os.path.dirname(p) == version_path and os.path.basename(p).startswith(_SHARD_PREFIX))
+    ]
+
+
+@contextlib.contextmanager
+def chroma_lease(tenant: Optional[str] = None) -> Iterator[None]:
+    # Hold around anything that queries or writes a tenant's Chroma clients: an eviction in
+    # the meantime only drops the tenant from the LRU and leaves the close to the last user.
+    tenant = tenant or current_tenant()
+    with _stores_lock:
+        _tenant_users[tenant] = _tenant_users.get(tenant, 0) + 1
+    try:
+        yield
+    finally:
+        with _stores_lock:
+            users = _tenant_users.pop(tenant) - 1
+            if users:
+                _tenant_users[tenant] = users
+            else:
+                for path in _deferred_close.pop(tenant, ()):
+                    _release_chroma_client(path)
+
+
+def _keep_open(tenant: str, paths: List[str]):
+    # a reopened tenant reuses its clients; cancel their deferred close
+    pending = _deferred_close.get(tenant)
+    if pending:
+        pending.difference_update(paths)
+
+
+def on_tenant_evicted(hook: Callable[[str], None]) -> Callable[[str], None]:
+    _eviction_hooks.append(hook)
+    return hook
+
+
+def evict_tenant(tenant: str):
+    # Close the live version a tenant holds open; it is reopened lazily on its next request.
+    # Staging versions belong to an ingest in progress and are left to it.
+    with _stores_lock:
+        entry = _chroma_stores.pop(tenant, None)
+        _weaviate_stores.pop(tenant, None)
+        if entry is not None:
+            version_path = os.path.join(entry["root"], entry["version"]) if entry["version"] else entry["root"]
+            paths = _version_client_paths(version_path)
+            if _tenant_users.get(tenant):
+                _deferred_close.setdefault(tenant, set()).update(paths)
+            else:
+                for path in paths:
+                    _release_chroma_client(path)
+    # in-flight users keep their own references; the caches are rebuilt on next use
+    for hook in _eviction_hooks:
+        hook(tenant)
+
+
+def _enforce_tenant_budget(keep: str):
+    budget = settings.tenant_cache_mb * 1024 * 1024
+    with _stores_lock:
+        while len(_chroma_stores) > 1:
+            total = sum(e["bytes"] for e in _chroma_stores.values())
+            if len(_chroma_stores) <= max(1, settings.tenant_cache_max) and total <= budget:
+                return
+            oldest = next(t for t in _chroma_stores if t != keep)
+            evict_tenant(oldest)
+
+
+def tenant_cache_stats() -> Dict[str, Any]:
+    with _stores_lock:
+        return {
+            "open": [{"tenant": t, "version": e["version"] or None, "est_bytes": e["bytes"]} for t, e in _chroma_stores.items()],
+            "est_bytes": sum(e["bytes"] for e in _chroma_stores.values()),
+            "budget_bytes": settings.tenant_cache_mb * 1024 * 1024,
+            "max_open": settings.tenant_cache_max,
+        }
 
 
 def get_chroma_vectorstore() -> Chroma:
-    global _vectorstore_chroma
-    if _vectorstore_chroma is not None:
-        return _vectorstore_chroma
-
-    client = _get_chroma_client()
+    tenant = current_tenant()
+    # CURRENT is re-read on each call so every worker picks up a newly published version
+    live = live_chroma_version()
+    with _stores_lock:
+        entry = _chroma_stores.get(tenant)
+        if entry is not None and entry["version"] == live and entry.get("store") is not None:
+            _chroma_stores.move_to_end(tenant)
+            return entry["store"]
+
+        _release_stale_chroma_clients()
+        client = _get_chroma_client(live)
+        try:
+            store = Chroma(
+                client=client,
+                collection_name=_chroma_collection_name(),
+                embedding_function=get_embeddings(),
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to initialize Chroma vector store: {e}")
+        path = _client_path(client)
+        _chroma_stores[tenant] = {"version": live, "store": store, "bytes": _estimate_store_bytes(path, store._collection), "root": _persist_path()}
+        _chroma_stores.move_to_end(tenant)
+        _keep_open(tenant, [path])
+        _enforce_tenant_budget(keep=tenant)
+        return store
+
+
+def chroma_shard_count(version: Optional[str] = None) -> int:
+    # A version keeps the shard count it was built with; CHROMA_SHARDS only applies to new, empty ones
+    path = chroma_version_path(version)
     try:
-        _vectorstore_chroma = Chroma(
+        with open(os.path.join(path, _SHARDS_FILE)) as f:
+            return max(1, int(f.read().strip()))
+    except (FileNotFoundError, ValueError):
+        pass
+    if os.path.exists(os.path.join(path, "chroma.sqlite3")):
+        # flat index built before sharding was enabled
+        return 1
+    return max(1, settings.chroma_shards)
+
+
+def get_chroma_shard_collections(version: Optional[str] = None, create: bool = False) -> List[Any]:
+    # One collection per shard. The live ones are cached in the tenant LRU next to the flat store.
+    tenant = current_tenant()
+    live = live_chroma_version()
+    version = live if version is None else version
+    n = chroma_shard_count(version)
+    if create:
+        path = chroma_version_path(version)
+        _ensure_dir_writable(path)
+        marker = os.path.join(path, _SHARDS_FILE)
+        if not os.path.exists(marker):
+            tmp = f"{marker}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "w") as f:
+                f.write(str(n))
+            os.replace(tmp, marker)
+    with _stores_lock:
+        entry = _chroma_stores.get(tenant)
+        if version == live and entry is not None and entry["version"] == live and entry.get("shards"):
+            _chroma_stores.move_to_end(tenant)
+            return entry["shards"]
+        _release_stale_chroma_clients()
+        try:
+            clients = [_get_chroma_client(version, shard=i) for i in range(n)]
+            shards = [c.get_or_create_collection(_chroma_collection_name()) for c in clients]
+        except Exception as e:
+            raise RuntimeError(f"Failed to initialize Chroma shards: {e}")
+        if version == live:
+            paths = [_client_path(c) for c in clients]
+            _chroma_stores[tenant] = {
+                "version": live,
+                "store": None,
+                "shards": shards,
+                "bytes": sum(_estimate_store_bytes(p, c) for p, c in zip(paths, shards)),
+                "root": _persist_path(),
+            }
+            _chroma_stores.move_to_end(tenant)
+            _keep_open(tenant, paths)
+            _enforce_tenant_budget(keep=tenant)
+        return shards
+
+
+def open_chroma_shards() -> Dict[str, List[Any]]:
+    # live shard collections already open, by tenant; opens nothing and leaves the LRU order alone
+    with _stores_lock:
+        return {t: list(e["shards"]) for t, e in _chroma_stores.items() if e.get("shards")}
+
+
+def build_chroma_from_documents(docs: List[Document], version: Optional[str] = None, ids: Optional[List[str]] = None) -> Chroma:
+    with chroma_lease():
+        client = _get_chroma_client(version)
+        # with ids this is an upsert, so re-adding the same chunks overwrites instead of duplicating
+        store = Chroma.from_documents(
+            documents=docs,
             client=client,
+            embedding=get_embeddings(),
             collection_name=_chroma_collection_name(),
-            embedding_function=get_embeddings(),
+            ids=ids,
         )
-        return _vectorstore_chroma
-    except Exception as e:
-        raise RuntimeError(f"Failed to initialize Chroma vector store: {e}")
+    chroma_version_written(version)
+    return store
 
 
-def build_chroma_from_documents(docs: List[Document]) -> Chroma:
-    client = _get_chroma_client()
-    store = Chroma.from_documents(
-        documents=docs,
-        client=client,
-        embedding=get_embeddings(),
-        collection_name=_chroma_collection_name(),
-    )
-    return store
+def chroma_version_written(version: Optional[str] = None):
+    # a version grew: re-estimate its memory, and if it is the open one, reopen it on next use
+    path = chroma_version_path(version)
+    with _stores_lock:
+        for p in list(_store_bytes):
+            if p == path or (os.path.dirname(p) == path and os.path.basename(p).startswith(_SHARD_PREFIX)):
+                _store_bytes.pop(p)
+        if version is None or version == live_chroma_version():
+            _chroma_stores.pop(current_tenant(), None)
 
 
-def reset_chroma():
-    global _vectorstore_chroma, _chroma_client
+@contextlib.contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def publish_chroma_version(version: str) -> bool:
+    # Atomic alias switch: readers see either the old or the new pointer, never a partial one.
+    # Version names sort by build start, so when two rebuilds overlap the newer one wins even if
+    # it finishes first; a stale publish is refused (False) and its version retired for GC.
+    _ensure_persist_dir()
+    root = _persist_path()
+    with _publish_lock, _file_lock(os.path.join(root, _PUBLISH_LOCK_FILE)):
+        previous = live_chroma_version()
+        if previous and version < previous:
+            logger.warning("Not publishing Chroma version %s: newer version %s is already live", version, previous)
+            _retire(chroma_version_path(version))
+            published = False
+        else:
+            pointer = os.path.join(root, _CURRENT_FILE)
+            tmp = f"{pointer}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "w") as f:
+                f.write(version)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, pointer)
+            if previous != version and (previous or _has_legacy_index(root)):
+                _retire(chroma_version_path(previous))
+            published = True
+    gc_chroma_versions()
+    return published
+
+
+def _has_legacy_index(root: str) -> bool:
+    # an index written straight into the persist dir, before versioned builds
+    return any(os.path.exists(os.path.join(root, f)) for f in ("chroma.sqlite3", _SHARDS_FILE))
+
+
+def _retire(path: str):
     try:
-        shutil.rmtree(_persist_path(), ignore_errors=True)
-    except Exception:
+        with open(os.path.join(path, _RETIRED_FILE), "w") as f:
+            f.write(str(time.time()))
+    except OSError:
         pass
-    _vectorstore_chroma = None
-    _chroma_client = None
+
+
+def _retired_at(path: str) -> float:
+    # versions that were never live (abandoned builds) count from their directory's mtime
+    for p in (os.path.join(path, _RETIRED_FILE), path):
+        try:
+            return os.path.getmtime(p)
+        except OSError:
+            continue
+    return 0.0
+
+
+def _remove_legacy_index(root: str):
+    # the persist dir also holds CURRENT and the version dirs, so only Chroma's own files go
+    _release_chroma_client(root)
+    _store_bytes.pop(root, None)
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name in ("chroma.sqlite3", _SHARDS_FILE, _RETIRED_FILE):
+            os.remove(path)
+        elif os.path.isdir(path) and name.startswith(_SHARD_PREFIX):
+            _release_chroma_clients_under(path)
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.isdir(path) and _is_uuid(name):
+            # HNSW segment directories
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _is_uuid(name: str) -> bool:
+    try:
+        uuid.UUID(name)
+        return True
+    except ValueError:
+        return False
+
+
+def gc_chroma_versions(keep: Optional[int] = None, grace: Optional[float] = None) -> List[str]:
+    # Keep the live version plus (keep - 1) predecessors. Older ones are deleted only after
+    # they have been retired for CHROMA_GC_GRACE_S, since other workers may still be reading
+    # them. Versions newer than live may be builds in progress and are left alone.
+    keep = max(1, keep if keep is not None else settings.chroma_keep_versions)
+    grace = settings.chroma_gc_grace_s if grace is None else grace
+    live = live_chroma_version()
+    if not live:
+        return []
+    root = _persist_path()
+    older = sorted(
+        d for d in os.listdir(root)
+        if d.startswith(_VERSION_PREFIX) and d < live and os.path.isdir(os.path.join(root, d))
+    )
+    if _has_legacy_index(root):
+        # the pre-versioning index is the oldest version ("")
+        older.insert(0, "")
+    now = time.time()
+    doomed = [
+        v for v in older[: max(0, len(older) - (keep - 1))]
+        if now - _retired_at(chroma_version_path(v)) >= grace
+    ]
+    for version in doomed:
+        if not version:
+            _remove_legacy_index(root)
+            continue
+        path = os.path.join(root, version)
+        _release_chroma_clients_under(path)
+        shutil.rmtree(path, ignore_errors=True)
+    return doomed
+
+
+def clear_cached_stores():
+    # forget cached embeddings/stores/clients so changed settings take effect (evaluation sweeps)
+    global _embeddings
+    with _stores_lock:
+        for tenant in list(_chroma_stores):
+            evict_tenant(tenant)
+        for path in list(_chroma_clients):
+            _release_chroma_client(path)
+        _weaviate_stores.clear()
+    _embeddings = None
+
+
+def reset_chroma():
+    # Switch the alias to a fresh, empty version instead of deleting the live files
+    publish_chroma_version(new_chroma_version())
+    with _stores_lock:
+        _chroma_stores.pop(current_tenant(), None)
 
 
 def get_weaviate_client() -> weaviate.WeaviateClient:
@@ -147,11 +612,12 @@ def get_weaviate_client() -> weaviate.WeaviateClient:
 
 
 def get_weaviate_vectorstore() -> Weaviate:
-    global _vectorstore_weaviate
-    if _vectorstore_weaviate is not None:
-        return _vectorstore_weaviate
+    tenant = current_tenant()
+    store = _weaviate_stores.get(tenant)
+    if store is not None:
+        return store
     client = get_weaviate_client()
-    _vectorstore_weaviate = Weaviate(
+    store = _weaviate_stores[tenant] = Weaviate(
         client=client,
         index_name=_weaviate_class_name(),
         text_key="text",
@@ -159,7 +625,7 @@ def get_weaviate_vectorstore() -> Weaviate:
         by_text=False,  # ensure nearVector is used (embed locally), avoiding nearText errors
         attributes=["file", "page", "source"],  # request metadata back with results
     )
-    return _vectorstore_weaviate
+    return store
 
 
 def get_vectorstore(backend: Literal["chroma", "weaviate"] = "chroma"):
@@ -169,7 +635,6 @@ def get_vectorstore(backend: Literal["chroma", "weaviate"] = "chroma"):
 
 
 def reset_vectorstore(backend: Literal["chroma", "weaviate"] = "chroma"):
-    global _vectorstore_weaviate
     if backend == "weaviate":
         try:
             client = get_weaviate_client()
@@ -184,13 +649,22 @@ def reset_vectorstore(backend: Literal["chroma", "weaviate"] = "chroma"):
                     client.schema.delete_class(class_name)
                 except Exception:
                     pass
-            _vectorstore_weaviate = None
+            _weaviate_stores.pop(current_tenant(), None)
         except Exception:
-            _vectorstore_weaviate = None
+            _weaviate_stores.pop(current_tenant(), None)
         return
     reset_chroma()
 
 
 def as_retriever(k: Optional[int] = None, backend: Literal["chroma", "weaviate"] = "chroma"):
     k = k or settings.top_k
+    if backend == "chroma" and chroma_shard_count() > 1:
+        from app.rag.sharded import ShardedRetriever
+        return ShardedRetriever(k=k)
+    if backend == "chroma" and (settings.retrieval_mode or "").lower() == "hierarchical":
+        from app.rag.hierarchy import HierarchicalRetriever
+        return HierarchicalRetriever(k=k)
+    if backend == "chroma" and (settings.shadow_index or "").lower() in ("int8", "binary"):
+        from app.rag.shadow import ShadowRetriever
+        return ShadowRetriever(k=k)
     return get_vectorstore(backend).as_retriever(search_kwargs={"k": k})
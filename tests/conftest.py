@@ -1,5 +1,6 @@
 import os
 import sys
+import pytest
 
 # Ensure project root is on sys.path so `import app` works in tests
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -7,3 +8,22 @@ PROJECT_ROOT = os.path.abspath(os.path.join(ROOT_DIR, os.pardir))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+
+@pytest.fixture
+def chroma_tmp(tmp_path, monkeypatch):
+    # isolated Chroma persist dir with offline deterministic embeddings
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app import vectorstore
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "chroma_persist_dir", str(tmp_path / "chroma"))
+    monkeypatch.setattr(settings, "chroma_keep_versions", 2)
+    monkeypatch.setattr(settings, "chroma_gc_grace_s", 0)
+    monkeypatch.setattr(vectorstore, "_embeddings", DeterministicFakeEmbedding(size=32))
+    monkeypatch.setattr(settings, "tenants_dir", str(tmp_path / "tenants"))
+    monkeypatch.setattr(vectorstore, "_chroma_stores", type(vectorstore._chroma_stores)())
+    yield tmp_path / "chroma"
+    for tenant in list(vectorstore._chroma_stores):
+        vectorstore.evict_tenant(tenant)
+    for path in list(vectorstore._chroma_clients):
+        vectorstore._release_chroma_client(path)
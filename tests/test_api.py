@@ -44,3 +44,110 @@ def test_ingest_weaviate_if_configured():
     assert data["backend"] == "weaviate"
     assert data["status"] in ("ok", "no_chunks")
 
+
+def _fake_pipeline(monkeypatch):
+    from langchain_core.documents import Document
+    from app.rag import generate
+
+    async def fake_retrieve(question, backend, k=None, tenant=None):
+        return [(Document(page_content="Retakes are allowed once.", metadata={"file": "policy.pdf", "page": 3}), 0.61)]
+
+    async def fake_llm(system_prompt, user_prompt):
+        for t in ["Retakes ", "are allowed ", "once [1]."]:
+            yield t
+
+    monkeypatch.setattr(generate, "retrieve", fake_retrieve)
+    monkeypatch.setattr(generate, "stream_llm", fake_llm)
+
+
+def _one_token_frame(monkeypatch):
+    from app.config import settings
+
+    # a window no slow runner can outlast: all deltas end up in one frame, flushed by citations
+    monkeypatch.setattr(settings, "ws_flush_ms", 10_000)
+    monkeypatch.setattr(settings, "ws_flush_bytes", 1 << 20)
+
+
+def test_chat_sse_stream(monkeypatch):
+    _fake_pipeline(monkeypatch)
+    with client.stream("POST", "/api/chat", json={"question": "Retake policy?", "stream": True}) as r:
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/event-stream")
+        body = "".join(r.iter_text())
+    events = [block.split("\n") for block in body.strip().split("\n\n")]
+    kinds = [e[0].removeprefix("event: ") for e in events]
+    assert kinds == ["sources", "token", "token", "token", "citations", "done"]
+    assert json.loads(events[0][1].removeprefix("data: "))["sources"] == [{"file": "policy.pdf", "page": 3, "score": 0.61}]
+    assert "".join(json.loads(e[1].removeprefix("data: "))["text"] for e in events[1:4]) == "Retakes are allowed once [1]."
+
+
+def test_legacy_chat_path_streams_too(monkeypatch):
+    _fake_pipeline(monkeypatch)
+    with client.stream("POST", "/chat", json={"question": "Retake policy?", "stream": True}) as r:
+        body = "".join(r.iter_text())
+    assert body.startswith("event: sources") and body.rstrip().endswith("event: done\ndata: {}")
+
+
+def test_abandoned_stream_closes_upstream(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from langchain_core.documents import Document
+    from app.config import settings
+    from app.rag import generate
+
+    class FakeStream:
+        closed = False
+
+        def __iter__(self):
+            for t in ["a ", "b ", "c "]:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=t))])
+
+        def close(self):
+            FakeStream.closed = True
+
+    class FakeOpenAI:
+        def __init__(self, **kwargs):
+            self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **kw: FakeStream()))
+
+    async def fake_retrieve(question, backend, k=None, tenant=None):
+        return [(Document(page_content="text", metadata={"file": "policy.pdf", "page": 1}), 0.9)]
+
+    monkeypatch.setattr(generate, "retrieve", fake_retrieve)
+    monkeypatch.setattr(generate, "OpenAI", FakeOpenAI)
+    monkeypatch.setattr(settings, "embeddings_provider", "openai")
+    monkeypatch.setattr(settings, "openai_api_key", "test")
+
+    async def run():
+        events = generate.chat_events("q", "chroma")
+        assert (await events.__anext__())["type"] == "sources"
+        assert (await events.__anext__())["text"] == "a "
+        # the client goes away after the first token
+        await events.aclose()
+        # right away, not when the event loop finalizes the abandoned generator
+        assert FakeStream.closed
+
+    asyncio.run(run())
+
+
+def test_ws_chat_stream(monkeypatch):
+    _fake_pipeline(monkeypatch)
+    _one_token_frame(monkeypatch)
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"question": "Retake policy?"})
+        assert ws.receive_json()["type"] == "sources"
+        # deltas share a frame until the citations flush it; citations follow in their own
+        assert ws.receive_text() == "Retakes are allowed once [1]."
+        assert "policy.pdf p.3" in ws.receive_text()
+        assert ws.receive_json() == {"type": "done"}
+
+
+def test_ws_chat_json_frames(monkeypatch):
+    _fake_pipeline(monkeypatch)
+    _one_token_frame(monkeypatch)
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"question": "Retake policy?", "format": "json"})
+        frames = []
+        while not frames or frames[-1]["type"] != "done":
+            frames.append(ws.receive_json())
+    assert [f["type"] for f in frames] == ["sources", "token", "citations", "done"]
+    assert frames[1]["text"] == "Retakes are allowed once [1]."
@@ -0,0 +1,33 @@
+import asyncio
+from app.rag import coalesce, generate
+
+
+def test_identical_requests_share_one_stream(monkeypatch):
+    calls = []
+
+    async def fake_chat_events(question, backend, k=None, tenant=None):
+        calls.append(question)
+        yield {"type": "sources", "sources": [], "backend": backend, "top_k": k}
+        for t in ["a", "b", "c", "d"]:
+            await asyncio.sleep(0.01)
+            yield {"type": "token", "text": t}
+        yield {"type": "done"}
+
+    monkeypatch.setattr(generate, "chat_events", fake_chat_events)
+
+    async def consume(question, delay):
+        await asyncio.sleep(delay)
+        return [e.get("text", e["type"]) for e in [ev async for ev in coalesce.coalesced_chat_events(question, "chroma", 4)]]
+
+    async def main():
+        return await asyncio.gather(
+            consume("What is the retake policy?", 0),
+            consume("  what is the RETAKE policy ", 0.025),  # late joiner: replay, then live
+            consume("Who is the dean?", 0),
+        )
+
+    first, late, other = asyncio.run(main())
+    expected = ["sources", "a", "b", "c", "d", "done"]
+    assert first == expected and late == expected and other == expected
+    assert sorted(calls) == ["What is the retake policy?", "Who is the dean?"]
+    assert coalesce._flights == {}
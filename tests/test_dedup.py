@@ -0,0 +1,71 @@
+import json
+import os
+from langchain_core.documents import Document
+from app.rag.dedup import dedup_chunks, dedup_passages, simhash
+from app.rag.splitter import split_docs
+
+BOILERPLATE = (
+    "Academic integrity is expected of all students. Plagiarism, cheating and unauthorized "
+    "collaboration will be reported to the Dean of Students and may result in a failing grade "
+    "for the course. Students with disabilities should contact the Accessibility Office to "
+    "arrange reasonable accommodations within the first two weeks of the semester."
+)
+
+
+def test_simhash_is_stable_and_close_for_near_duplicates():
+    a = simhash(BOILERPLATE)
+    assert a == simhash(BOILERPLATE)
+    near = simhash(BOILERPLATE.replace("first two weeks", "first 2 weeks"))
+    other = simhash("The library is open from 8am to 10pm on weekdays and closed on holidays.")
+    assert bin(a ^ near).count("1") < bin(a ^ other).count("1")
+
+
+def test_dedup_collapses_and_keeps_all_sources():
+    chunks = [
+        Document(page_content=BOILERPLATE, metadata={"file": "a.pdf", "page": 1}),
+        Document(page_content="Late work loses ten percent per day unless an extension was granted.", metadata={"file": "a.pdf", "page": 2}),
+        Document(page_content=BOILERPLATE + " ", metadata={"file": "b.pdf", "page": 4}),
+        Document(page_content=BOILERPLATE, metadata={"file": "c.pdf", "page": 0}),
+    ]
+    kept, report = dedup_chunks(chunks, max_distance=3)
+    assert [d.metadata["file"] for d in kept] == ["a.pdf", "a.pdf"]
+    assert report["removed"] == 2 and report["chunks_out"] == 2
+    refs = json.loads(kept[0].metadata["duplicate_sources"])
+    assert refs == [{"file": "a.pdf", "page": 1}, {"file": "b.pdf", "page": 4}, {"file": "c.pdf", "page": 0}]
+    assert "duplicate_sources" not in kept[1].metadata
+
+
+def test_repeated_passage_is_cut_wherever_chunks_split():
+    intro = "Section {n}. The following rules apply to this course and are enforced by the instructor of record. "
+    pages = [
+        Document(page_content=intro.format(n=1) + BOILERPLATE, metadata={"file": "a.pdf", "page": 0}),
+        # same passage, different surrounding text: chunk-level SimHash would not match these pages
+        Document(page_content=intro.format(n=2).upper() + "Office hours are Tuesdays.\n" + BOILERPLATE + "\nLabs start in week three.", metadata={"file": "b.pdf", "page": 3}),
+    ]
+    out, report = dedup_passages(pages, min_words=20)
+    assert report["passages_removed"] == 1
+    assert "Accessibility Office" not in out[1].page_content
+    assert "Office hours are Tuesdays." in out[1].page_content and "Labs start in week three." in out[1].page_content
+    assert json.loads(out[0].metadata["duplicate_sources"]) == [{"file": "a.pdf", "page": 0}, {"file": "b.pdf", "page": 3}]
+    # the sources recorded here survive the chunk-level pass
+    kept, _ = dedup_chunks(out, max_distance=3)
+    assert json.loads(kept[0].metadata["duplicate_sources"])[1] == {"file": "b.pdf", "page": 3}
+
+
+def test_bundled_pdfs_lose_their_repeated_passages():
+    from app.rag.loaders import discover_pdfs, load_pdfs
+    from app.rag.index import split_and_dedup
+
+    docs, _ = load_pdfs(discover_pdfs(os.path.join("data", "pdfs")))
+    # the handbook repeats its grading table (p.17 -> p.20) and award conditions (p.23 -> p.24)
+    table = "90-100 A 4.00 Outstanding"
+    assert [d.metadata["page"] for d in docs if table in " ".join(d.page_content.split())] == [16, 19]
+    pages, report = dedup_passages(docs)
+    assert report["passages_removed"] >= 2
+    assert [d.metadata["page"] for d in pages if table in " ".join(d.page_content.split())] == [16]
+    # the grading scheme intro on p.20 is unique text and stays
+    assert "letter grades for the registered credits" in pages[docs.index(next(d for d in docs if table in d.page_content and d.metadata["page"] == 19))].page_content
+
+    chunks, unique, summary = split_and_dedup(docs)
+    assert summary["passages"] == report
+    assert sum(len(c.page_content) for c in unique) < sum(len(c.page_content) for c in split_docs(docs))
@@ -0,0 +1,14 @@
+from app.config import settings
+from app.rag.evaluate import run_eval, format_table
+
+
+def test_eval_sweep_reports_quality_and_latency():
+    provider = settings.embeddings_provider
+    rows = run_eval([1000], [200], [2, 4], ["chroma"])
+    assert settings.embeddings_provider == provider  # overrides are restored
+    assert [r["top_k"] for r in rows] == [2, 4]
+    for r in rows:
+        assert 0.5 <= r["recall@k"] <= 1.0 and 0 < r["mrr"] <= 1.0
+        assert r["index_bytes"] > 0 and r["chunks"] > 0 and r["query_ms_p50"] > 0
+    assert rows[1]["recall@k"] >= rows[0]["recall@k"]
+    assert "recall@k" in format_table(rows)
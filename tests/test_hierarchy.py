@@ -0,0 +1,121 @@
+from langchain_core.documents import Document
+from app import vectorstore
+from app.config import settings
+from app.rag import hierarchy
+from app.rag.embeddings import HashEmbeddings
+from app.rag.index import index_docs
+
+TOPICS = {
+    "grading.pdf": "grading scale letter grade percentage curve",
+    "parking.pdf": "parking permit campus lot vehicle",
+    "library.pdf": "library books borrowing overdue fines",
+    "housing.pdf": "housing dormitory roommate residence hall",
+    "exams.pdf": "final exam schedule retake makeup",
+    "visa.pdf": "international students visa immigration status",
+}
+
+
+def _corpus():
+    docs = []
+    for file, words in TOPICS.items():
+        for i in range(10):
+            docs.append(Document(
+                page_content=f"{words} section {i} policy details {file}",
+                metadata={"file": file, "page": i // 2, "source": file},
+            ))
+    return docs
+
+
+def test_hierarchical_matches_flat_and_scopes_to_top_sections(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(vectorstore, "_embeddings", HashEmbeddings(dim=256))
+    monkeypatch.setattr(settings, "hierarchy_section_chunks", 4)
+    monkeypatch.setattr(settings, "hierarchy_top_docs", 2)
+    hierarchy.invalidate_sections()
+    monkeypatch.setattr(settings, "retrieval_mode", "hierarchical")
+
+    summary = index_docs(_corpus(), backend="chroma")
+    assert summary["status"] == "ok"
+    # 10 chunks over 5 pages per file, packed by whole pages into sections of >= 4 chunks
+    assert summary["debug"]["doc_index"] == {**summary["debug"]["doc_index"], "sections": 18, "chunks": 60}
+
+    question = "how do I get a parking permit for my vehicle"
+    flat = vectorstore.get_chroma_vectorstore().similarity_search_with_relevance_scores(question, k=4)
+    retriever = vectorstore.as_retriever(k=4, backend="chroma")
+    scored = retriever.search_with_scores(question)
+    # same best match and the same relevance scale as a flat Chroma search
+    assert scored[0][0].metadata["file"] == flat[0][0].metadata["file"]
+    assert abs(scored[0][1] - flat[0][1]) < 1e-4
+    assert {d.metadata["file"] for d, _ in scored} == {"parking.pdf"}
+    assert all(s <= 1 for _, s in scored) and [s for _, s in scored] == sorted((s for _, s in scored), reverse=True)
+
+
+def test_older_indexes_are_searched_flat_without_building(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(vectorstore, "_embeddings", HashEmbeddings(dim=256))
+    # flat mode: ingest writes neither the section index nor the vector file
+    debug = index_docs(_corpus(), backend="chroma")["debug"]
+    assert "doc_index" not in debug and "vector_file" not in debug
+    hierarchy.invalidate_sections()
+    query = vectorstore.get_embeddings().embed_query("library overdue fines")
+    got = hierarchy.hierarchical_search(query, k=3)
+    assert [d.metadata["file"] for d, _ in got] == ["library.pdf"] * 3
+    # the query path never builds one
+    assert hierarchy.doc_index_collection() is None
+
+
+def test_missing_sections_collection_falls_back_to_flat(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(vectorstore, "_embeddings", HashEmbeddings(dim=256))
+    monkeypatch.setattr(settings, "retrieval_mode", "hierarchical")
+    index_docs(_corpus(), backend="chroma")
+    # another worker's rebuild deleted the collection this version's DOC_INDEX names
+    vectorstore._get_chroma_client().delete_collection(hierarchy.doc_index_collection())
+    hierarchy.invalidate_sections()
+    query = vectorstore.get_embeddings().embed_query("library overdue fines")
+    got = hierarchy.hierarchical_search(query, k=3)
+    assert [d.metadata["file"] for d, _ in got] == ["library.pdf"] * 3
+
+
+def test_second_stage_reads_no_embeddings_from_chroma(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(vectorstore, "_embeddings", HashEmbeddings(dim=256))
+    monkeypatch.setattr(settings, "retrieval_mode", "hierarchical")
+    assert "vectors" in index_docs(_corpus(), backend="chroma")["debug"]["vector_file"]
+    hierarchy.invalidate_sections()
+    collection = vectorstore.get_chroma_vectorstore()._collection
+    includes = []
+    get = collection.get
+
+    def spy(*args, **kwargs):
+        includes.append(kwargs.get("include"))
+        return get(*args, **kwargs)
+
+    monkeypatch.setattr(collection, "get", spy)
+    query = vectorstore.get_embeddings().embed_query("library overdue fines")
+    got = hierarchy.hierarchical_search(query, k=3)
+    assert [d.metadata["file"] for d, _ in got] == ["library.pdf"] * 3
+    assert includes and all("embeddings" not in inc for inc in includes)
+
+
+def test_rebuild_switches_atomically(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(vectorstore, "_embeddings", HashEmbeddings(dim=256))
+    vectorstore.build_chroma_from_documents(_corpus())
+    names = []
+    for _ in range(3):
+        hierarchy.build_doc_index()
+        names.append(hierarchy.doc_index_collection())
+    assert len(set(names)) == 3
+    # the live collection and the one it replaced are kept for readers mid-load
+    client = vectorstore._get_chroma_client()
+    kept = {c.name for c in client.list_collections() if c.name.startswith(hierarchy._doc_collection_prefix())}
+    assert kept == set(names[1:])
+
+
+def test_failed_section_build_does_not_fail_ingest(chroma_tmp, monkeypatch):
+    from app.rag import index
+
+    def broken(version=None):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(settings, "retrieval_mode", "hierarchical")
+    monkeypatch.setattr(index, "build_doc_index", broken)
+    summary = index_docs(_corpus(), backend="chroma")
+    assert summary["status"] == "ok"
+    assert summary["debug"]["doc_index"] == {"error": "boom"}
@@ -0,0 +1,93 @@
+import json
+import os
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app import vectorstore
+from app.config import settings
+from app.rag import index
+from app.rag.index import ingest_resumable
+
+
+class _CrashingEmbedding(DeterministicFakeEmbedding):
+    # dies on the Nth embed_documents call, like an OOM/rate limit halfway through an ingest
+    crash_on: int = 0
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls == self.crash_on:
+            raise RuntimeError("simulated crash")
+        return super().embed_documents(texts)
+
+
+def test_resume_after_crash_skips_finished_batches(chroma_tmp, tmp_path, monkeypatch):
+    checkpoint = str(tmp_path / "ckpt.json")
+    monkeypatch.setattr(settings, "chunk_size", 1000)
+    monkeypatch.setattr(settings, "chunk_overlap", 200)
+
+    dry = ingest_resumable(force_reset=True, checkpoint_path=checkpoint, batch_size=32, dry_run=True)
+    assert dry["status"] == "dry_run" and dry["chunks_to_embed"] > 64 and dry["est_tokens"] > 0
+    assert not os.path.exists(checkpoint)
+
+    emb = _CrashingEmbedding(size=32, crash_on=4)
+    monkeypatch.setattr(vectorstore, "_embeddings", emb)
+    first = ingest_resumable(force_reset=True, checkpoint_path=checkpoint, batch_size=32)
+    assert first["status"] == "error" and first["chunks_indexed"] > 0
+    state = json.load(open(checkpoint))
+    assert sum(f["batches_done"] for f in state["files"].values()) == 3
+    # nothing published yet: the staging version is only in the checkpoint
+    assert vectorstore.live_chroma_version() != state["version"]
+
+    resumed = ingest_resumable(force_reset=True, checkpoint_path=checkpoint, batch_size=32)
+    assert resumed["status"] == "ok" and resumed["resumed"]
+    assert resumed["chunks_skipped"] == first["chunks_indexed"]
+    assert resumed["chunks_indexed"] + resumed["chunks_skipped"] == dry["chunks_to_embed"]
+    # finished batches were not embedded again: 3 ok + 1 crash, then only the remaining batches
+    assert emb.calls == 1 + sum(f["batches"] for f in dry["files"])
+    assert resumed["published_version"] == state["version"] == vectorstore.live_chroma_version()
+    assert vectorstore.get_chroma_vectorstore()._collection.count() == dry["chunks_to_embed"]
+    assert not os.path.exists(checkpoint)
+
+    # re-adding without a reset upserts by deterministic id instead of duplicating
+    again = ingest_resumable(checkpoint_path=checkpoint, batch_size=32)
+    assert again["status"] == "ok"
+    assert vectorstore.get_chroma_vectorstore()._collection.count() == dry["chunks_to_embed"]
+
+
+def test_checkpoint_from_other_settings_is_rejected(chroma_tmp, tmp_path, monkeypatch):
+    checkpoint = str(tmp_path / "ckpt.json")
+    with open(checkpoint, "w") as f:
+        json.dump({"settings": {"chunk_size": 1}, "files": {}}, f)
+    out = ingest_resumable(checkpoint_path=checkpoint, batch_size=32)
+    assert out["status"] == "error" and "--restart" in out["error"]
+
+
+def test_weaviate_run_uses_one_client(chroma_tmp, tmp_path, monkeypatch):
+    clients, seen = [], set()
+    monkeypatch.setattr(index, "get_weaviate_client", lambda: clients.append(object()) or clients[-1])
+
+    def fake_bulk(docs, client=None, ids=None):
+        seen.add(id(client))
+        return {"errors": []}
+
+    monkeypatch.setattr(index, "bulk_import_weaviate", fake_bulk)
+    out = ingest_resumable(backend="weaviate", checkpoint_path=str(tmp_path / "ckpt.json"), batch_size=32)
+    assert out["status"] == "ok" and out["chunks_indexed"] > 64
+    assert len(clients) == 1 and seen == {id(clients[0])}
+
+
+def test_token_estimate_is_offline_unless_opted_in(monkeypatch):
+    import tiktoken
+    from app.config import settings
+
+    class FakeEncoding:
+        def encode(self, text):
+            return text.split()
+
+    calls = []
+    monkeypatch.setattr(index, "_token_encoder", None)
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: calls.append(name) or FakeEncoding())
+    assert index.estimate_tokens(["abcdefgh"]) == {"tokens": 2, "method": "chars/4"}
+    assert calls == []
+    monkeypatch.setattr(settings, "token_estimate", "tiktoken")
+    assert index.estimate_tokens(["one two three"]) == {"tokens": 3, "method": "cl100k_base"}
+    assert calls == ["cl100k_base"]
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import time
+from fastapi.testclient import TestClient
+from app.loadtest import _text_of, build_fake_llm, fake_llm_from_env, run_session, summarize
+from app.main import app
+from app.monitoring import LoopLagMonitor
+
+
+def test_loop_lag_monitor_records_blocking():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.01, warn=0.1)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)  # blocks the loop
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(run())
+    assert stats["lag_ms_max"] >= 150
+    assert stats["stalls"] == 1
+    assert stats["samples"] >= 5
+    assert not stats["running"]
+
+
+def test_health_reports_event_loop_lag():
+    with TestClient(app) as client:
+        lag = client.get("/health").json()["event_loop"]
+    assert lag["running"] is True
+    assert lag["interval_ms"] > 0
+
+
+def test_fake_llm_streams_openai_chunks():
+    client = TestClient(build_fake_llm(tokens=3, delay_ms=0))
+    r = client.post("/v1/chat/completions", json={"model": "m", "messages": [], "stream": True})
+    lines = [line[len("data: "):] for line in r.text.splitlines() if line.startswith("data: ")]
+    assert lines[-1] == "[DONE]"
+    chunks = [json.loads(line) for line in lines[:-1]]
+    assert "".join(c["choices"][0]["delta"].get("content") or "" for c in chunks) == "w0 w1 w2 "
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+
+
+def test_fake_llm_factory_reads_env(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_TOKENS", "2")
+    monkeypatch.setenv("FAKE_LLM_DELAY_MS", "0")
+    r = TestClient(fake_llm_from_env()).post("/v1/chat/completions", json={"messages": [], "stream": True})
+    assert r.text.count('"content": "w') == 2
+
+
+def test_session_times_out_on_silent_server():
+    async def run():
+        # accepts the TCP connection but never answers the WebSocket handshake
+        held = []
+        server = await asyncio.start_server(lambda reader, writer: held.append(writer), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await run_session(f"ws://127.0.0.1:{port}/ws/chat", "q", timeout=0.3)
+
+    r = asyncio.run(run())
+    assert r["error"] == "timeout"
+    assert not r["ok"] and r["total_ms"] < 2000
+
+
+def test_summary_counts_tokens_and_errors():
+    assert _text_of('{"type": "sources", "sources": []}') is None
+    assert _text_of("w1 ") == "w1 "
+    ok = {"ok": True, "error": None, "connect_ms": 5.0, "ttft_ms": 40.0, "tokens_per_sec": 50.0, "frames": 10}
+    failed = {"ok": False, "error": "timeout", "connect_ms": None, "ttft_ms": None, "tokens_per_sec": None, "frames": 0}
+    row = summarize(4, [ok, ok, ok, failed], wall=1.0)
+    assert row["ok"] == 3
+    assert row["error_rate"] == 0.25
+    assert row["errors"] == "timeout=1"
+    assert row["ttft_ms_p50"] == 40.0
+    assert row["tok_s_p50"] == 50.0
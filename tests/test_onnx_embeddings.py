@@ -0,0 +1,75 @@
+import struct
+import numpy as np
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from app.rag.embeddings import OnnxEmbeddings
+
+WORDS = ["[PAD]", "[UNK]", "attendance", "policy", "exam", "retake", "library", "fine", "grade", "course"]
+DIM = 8
+
+
+# Minimal protobuf writer: enough of onnx.proto for a one-node model, since the onnx
+# package (with its helper API) is not a dependency of this project.
+def _varint(n):
+    out = b""
+    while True:
+        b, n = n & 0x7F, n >> 7
+        out += bytes([b | (0x80 if n else 0)])
+        if not n:
+            return out
+
+
+def _field(num, value):
+    if isinstance(value, int):
+        return _varint(num << 3) + _varint(value)
+    data = value.encode() if isinstance(value, str) else value
+    return _varint(num << 3 | 2) + _varint(len(data)) + data
+
+
+def _value_info(name, elem_type, dims):
+    shape = b"".join(_field(1, _field(2, d) if isinstance(d, str) else _field(1, d)) for d in dims)
+    return _field(1, name) + _field(2, _field(1, _field(1, elem_type) + _field(2, shape)))
+
+
+def _tiny_model(path, table):
+    # last_hidden_state = Gather(table, input_ids): a per-token embedding lookup
+    initializer = (
+        b"".join(_field(1, d) for d in table.shape) + _field(2, 1) + _field(8, "table")
+        + _field(9, struct.pack(f"<{table.size}f", *table.ravel()))
+    )
+    node = _field(1, "table") + _field(1, "input_ids") + _field(2, "last_hidden_state") + _field(4, "Gather")
+    graph = (
+        _field(1, node) + _field(2, "tiny") + _field(5, initializer)
+        + _field(11, _value_info("input_ids", 7, ["batch", "seq"]))
+        + _field(12, _value_info("last_hidden_state", 1, ["batch", "seq", DIM]))
+    )
+    model = _field(1, 7) + _field(8, _field(1, "") + _field(2, 13)) + _field(7, graph)
+    with open(path, "wb") as f:
+        f.write(model)
+
+
+def _model_dir(tmp_path):
+    table = np.random.default_rng(0).normal(size=(len(WORDS), DIM)).astype(np.float32)
+    _tiny_model(tmp_path / "model.onnx", table)
+    tok = Tokenizer(WordLevel({w: i for i, w in enumerate(WORDS)}, unk_token="[UNK]"))
+    tok.pre_tokenizer = Whitespace()
+    tok.save(str(tmp_path / "tokenizer.json"))
+    return table
+
+
+def test_batched_inference_matches_single_text(tmp_path):
+    table = _model_dir(tmp_path)
+    emb = OnnxEmbeddings(model_dir=str(tmp_path), batch_size=2, threads=1, cache_size=8)
+    texts = ["attendance policy", "exam retake policy for every course grade", "library fine", "grade"]
+    batched = np.asarray(emb.embed_documents(texts))
+
+    # padding inside a batch must not leak into the mean pooling
+    for text, vec in zip(texts, batched):
+        assert np.allclose(vec, emb.embed_query(text), atol=1e-6)
+    expected = table[[WORDS.index(w) for w in "library fine".split()]].mean(axis=0)
+    assert np.allclose(batched[2], expected / np.linalg.norm(expected), atol=1e-6)
+    assert np.allclose(np.linalg.norm(batched, axis=1), 1.0, atol=1e-5)
+
+    # the token cache served the repeated texts
+    assert emb.cache_misses == len(texts) and emb.cache_hits == len(texts)
@@ -0,0 +1,112 @@
+import asyncio
+from langchain_core.documents import Document
+from app.config import settings
+from app.rag import generate
+from app.rag.embeddings import HashEmbeddings
+
+
+def _scored(*scores):
+    return [(Document(page_content=f"chunk {i}", metadata={"file": "a.pdf", "page": i}), s) for i, s in enumerate(scores)]
+
+
+def test_threshold_and_adaptive_k():
+    # absolute threshold
+    assert [s for _, s in generate.score_cutoff(_scored(0.5, 0.1, -0.2), threshold=0.0, max_gap=1.0)] == [0.5, 0.1]
+    # results falling far below the best one are dropped even above the threshold
+    assert [s for _, s in generate.score_cutoff(_scored(0.62, 0.58, 0.31, 0.3), threshold=0.0, max_gap=0.2)] == [0.62, 0.58]
+    assert generate.score_cutoff(_scored(-0.3, -0.35), threshold=0.0, max_gap=0.2) == []
+    # disabled cutoffs keep everything
+    assert len(generate.score_cutoff(_scored(-0.9, 0.4), threshold=float("-inf"), max_gap=float("inf"))) == 2
+
+
+class _ScaledEmbeddings(HashEmbeddings):
+    # not unit length, like Ollama's nomic-embed-text (norms around 20)
+    def _embed(self, text):
+        return [20.0 * v for v in super()._embed(text)]
+
+
+def test_default_threshold_answers_with_unnormalized_embeddings(chroma_tmp, monkeypatch):
+    from app import vectorstore
+    from app.config import Settings
+
+    monkeypatch.delenv("RELEVANCE_THRESHOLD", raising=False)
+    monkeypatch.setattr(settings, "relevance_threshold", Settings().relevance_threshold)
+    monkeypatch.setattr(vectorstore, "_embeddings", _ScaledEmbeddings(dim=256))
+    vectorstore.build_chroma_from_documents([
+        Document(page_content="final exam retake policy and makeup schedule", metadata={"file": "exams.pdf", "page": 0}),
+        Document(page_content="campus parking permit for students", metadata={"file": "parking.pdf", "page": 0}),
+    ])
+    question = "when can I retake the final exam"
+    # even the best match scores far below 0.0 on the l2 relevance scale
+    assert generate.search_with_scores(question, "chroma", 2)[0][1] < 0.0
+
+    async def llm(system_prompt, user_prompt):
+        yield "answer"
+
+    monkeypatch.setattr(generate, "stream_llm", llm)
+
+    async def run():
+        return [e async for e in generate.chat_events(question, "chroma", 2)]
+
+    events = asyncio.run(run())
+    assert events[0]["type"] == "sources"
+    assert events[0]["sources"][0]["file"] == "exams.pdf"
+
+
+def test_unanswerable_question_skips_the_llm(monkeypatch):
+    monkeypatch.setattr(settings, "relevance_threshold", 0.0)
+    monkeypatch.setattr(generate, "search_with_scores", lambda question, backend, k: _scored(-0.31, -0.33, -0.34, -0.4))
+
+    async def no_llm(system_prompt, user_prompt):
+        raise AssertionError("LLM must not be called")
+        yield
+
+    monkeypatch.setattr(generate, "stream_llm", no_llm)
+
+    async def run():
+        return [e async for e in generate.chat_events("What is the capital of France?", "chroma", 4)]
+
+    assert asyncio.run(run()) == [{"type": "no_context", "answer": generate.NO_CONTEXT_ANSWER, "sources": []}]
+
+
+def _weaviate_store(stored):
+    # the LangChain Weaviate wrapper over a mocked v3 client returning the given objects
+    from unittest.mock import MagicMock
+    import weaviate
+    from langchain_community.vectorstores import Weaviate
+    from app.rag.embeddings import HashEmbeddings
+
+    embeddings = HashEmbeddings(dim=64)
+    client = MagicMock(spec=weaviate.Client)
+    client.query = MagicMock()
+    hits = [{"text": text, "file": "a.pdf", "page": 0, "_additional": {"vector": embeddings.embed_query(like)}} for text, like in stored]
+    query = client.query.get.return_value.with_near_vector.return_value
+    query.with_limit.return_value.with_additional.return_value.do.return_value = {"data": {"Get": {"UniversityDocHash": hits}}}
+    return Weaviate(client=client, index_name="UniversityDocHash", text_key="text", embedding=embeddings, by_text=False)
+
+
+def test_weaviate_scores_use_the_chroma_scale(monkeypatch):
+    question = "when is the final exam retake"
+    store = _weaviate_store([("exam policy", question), ("parking permits", "campus parking permit lot")])
+    monkeypatch.setattr(generate, "as_retriever", lambda k, backend: store.as_retriever())
+    monkeypatch.setattr(generate, "get_vectorstore", lambda backend: store)
+
+    scored = generate.search_with_scores(question, "weaviate", 2)
+    # identical vectors score 1.0 as in Chroma; an unrelated one falls below a threshold of 0.0
+    assert round(scored[0][1], 4) == 1.0
+    assert scored[1][1] < 0.0
+    kept = generate.score_cutoff(scored, threshold=0.0, max_gap=0.2)
+    assert [d.page_content for d, _ in kept] == ["exam policy"]
+
+
+def test_weaviate_unanswerable_question_is_no_context(monkeypatch):
+    store = _weaviate_store([("parking permits", "campus parking permit lot"), ("library fines", "overdue library books")])
+    monkeypatch.setattr(generate, "as_retriever", lambda k, backend: store.as_retriever())
+    monkeypatch.setattr(generate, "get_vectorstore", lambda backend: store)
+    monkeypatch.setattr(settings, "relevance_threshold", 0.0)
+    monkeypatch.setattr(settings, "relevance_max_gap", 0.2)
+
+    async def run():
+        return [e async for e in generate.chat_events("What is the capital of France?", "weaviate", 4)]
+
+    assert asyncio.run(run())[0]["type"] == "no_context"
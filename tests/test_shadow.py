@@ -0,0 +1,105 @@
+import os
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app import vectorstore
+from app.config import settings
+from app.rag import shadow
+from app.rag.vector_file import VectorFile, export_vector_file, load_vector_file
+
+
+@pytest.fixture
+def shadow_store(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(shadow, "_shadows", {})
+    # binary codes need realistic dimensionality to rank well
+    monkeypatch.setattr(vectorstore, "_embeddings", DeterministicFakeEmbedding(size=384))
+    docs = [Document(page_content=f"policy paragraph {i}", metadata={"file": f"f{i % 7}.pdf", "page": i}) for i in range(300)]
+    vectorstore.build_chroma_from_documents(docs)
+    export_vector_file()
+    return docs
+
+
+# random fake embeddings have no neighbourhood structure, so 1-bit codes recall less than on real data
+@pytest.mark.parametrize("mode,min_recall", [("int8", 0.9), ("binary", 0.5)])
+def test_shadow_index_matches_exact_search(shadow_store, monkeypatch, mode, min_recall):
+    monkeypatch.setattr(settings, "shadow_index", mode)
+    retriever = vectorstore.as_retriever(k=4)
+    assert isinstance(retriever, shadow.ShadowRetriever)
+
+    results = retriever.search_with_scores("policy paragraph 42")
+    assert results[0][0].page_content == "policy paragraph 42"
+    assert results[0][0].metadata["page"] == 42
+    assert results[0][1] == pytest.approx(1.0, abs=1e-4)
+    assert [d.page_content for d in retriever.invoke("policy paragraph 42")] == [d.page_content for d, _ in results]
+
+    index = shadow.get_shadow_index()
+    mem = index.memory()
+    assert mem["vectors"] == 300 and mem["bytes"] < mem["float32_bytes"] / 3
+    assert index.recall_report(k=4, sample=20)["recall"] >= min_recall
+
+
+class _Collection:
+    # documents/metadata only, like the shadow query path asks for
+    def get(self, ids=None, include=()):
+        assert "embeddings" not in include
+        return {"ids": list(reversed(ids)), "documents": list(reversed(ids)), "metadatas": [{} for _ in ids]}
+
+
+def _vector_file(path, ids, vecs):
+    import json
+    import numpy as np
+
+    os.makedirs(path)
+    np.save(os.path.join(path, "vectors.npy"), np.asarray(vecs, dtype=np.float32))
+    with open(os.path.join(path, "ids.json"), "w") as f:
+        json.dump(ids, f)
+    return VectorFile(str(path))
+
+
+def test_int8_candidates_use_rescore_metric(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "shadow_rescore_factor", 1)
+    # unnormalized: "far" has the largest dot product with q but "near" is closest in L2
+    ids = ["near", "far", "other"]
+    vecs = [[1.0, 0.1], [10.0, 0.0], [-1.0, 1.0]]
+    index = shadow.ShadowIndex(_Collection(), _vector_file(tmp_path / "v", ids, vecs), "int8", "").load()
+    assert [d.page_content for d, _ in index.search([1.0, 0.0], k=1)] == ["near"]
+    assert index.memory()["id_bytes"] > 0
+    assert index.memory()["total_bytes"] == index.memory()["bytes"] + index.memory()["id_bytes"]
+
+
+def test_shadow_search_never_reads_chroma_vectors(shadow_store, monkeypatch):
+    monkeypatch.setattr(settings, "shadow_index", "int8")
+    index = shadow.get_shadow_index()
+    real_get = index.collection.get
+
+    def get(*args, include=(), **kwargs):
+        assert "embeddings" not in include
+        return real_get(*args, include=include, **kwargs)
+
+    monkeypatch.setattr(index.collection, "get", get)
+    results = vectorstore.as_retriever(k=3).search_with_scores("policy paragraph 7")
+    assert results[0][0].page_content == "policy paragraph 7"
+    # the float32 copy lives in the version's vector file, not in this process's heap
+    mem = index.memory()
+    assert mem["float32_bytes"] >= 300 * 384 * 4 and mem["vector_file"] == load_vector_file().name
+    assert mem["process"]["rss_bytes"] is None or mem["process"]["rss_bytes"] > 0
+
+
+def test_missing_vector_file_falls_back_to_chroma(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(shadow, "_shadows", {})
+    monkeypatch.setattr(vectorstore, "_embeddings", DeterministicFakeEmbedding(size=64))
+    monkeypatch.setattr(settings, "shadow_index", "int8")
+    vectorstore.build_chroma_from_documents([Document(page_content="only chunk", metadata={"file": "a.pdf", "page": 1})])
+    assert shadow.get_shadow_index() is None
+    results = vectorstore.as_retriever(k=1).search_with_scores("only chunk")
+    assert results[0][0].page_content == "only chunk" and results[0][1] == pytest.approx(1.0, abs=1e-4)
+
+
+def test_shadow_report_caps_sample(chroma_tmp, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    monkeypatch.setattr(settings, "shadow_index", "int8")
+    with TestClient(app) as client:
+        assert client.get("/api/shadow-index", params={"sample": 100000}).status_code == 422
+        assert client.get("/api/shadow-index", params={"sample": 0}).status_code == 422
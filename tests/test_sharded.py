@@ -0,0 +1,74 @@
+from langchain_core.documents import Document
+from app import vectorstore
+from app.config import settings
+from app.rag import sharded
+from app.rag.embeddings import HashEmbeddings
+from app.rag.index import index_docs
+from app.tenancy import DEFAULT_TENANT
+
+
+def _corpus():
+    topics = ["grading scale letter grade", "parking permit campus lot", "library books overdue fines",
+              "housing dormitory roommate", "final exam schedule retake", "visa immigration status"]
+    return [
+        Document(page_content=f"{words} policy {i}", metadata={"file": f"{words.split()[0]}.pdf", "page": i})
+        for words in topics for i in range(8)
+    ]
+
+
+def _ranked(pairs):
+    # hash embeddings tie within a topic, so compare files and scores rather than exact chunks
+    return [(d.metadata["file"], round(s, 5)) for d, s in pairs]
+
+
+def test_sharded_search_matches_flat(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(vectorstore, "_embeddings", HashEmbeddings(dim=256))
+    docs = _corpus()
+    questions = ["when is the final exam retake", "parking permit for campus", "overdue library fines"]
+
+    monkeypatch.setattr(settings, "shadow_index", "")
+    flat_version = vectorstore.new_chroma_version()
+    assert index_docs(docs, version=flat_version)["status"] == "ok"
+    vectorstore.publish_chroma_version(flat_version)
+    monkeypatch.setattr(settings, "chroma_shards", 3)
+    # the flat version keeps its layout even though CHROMA_SHARDS changed
+    assert vectorstore.chroma_shard_count() == 1
+    flat = {q: _ranked(vectorstore.get_chroma_vectorstore()._similarity_search_with_relevance_scores(q, k=5)) for q in questions}
+
+    version = vectorstore.new_chroma_version()
+    summary = index_docs(docs, version=version)
+    vectorstore.publish_chroma_version(version)
+    assert summary["debug"]["sharding"]["shards"] == 3
+    assert sum(summary["debug"]["sharding"]["chunks_per_shard"]) == len(docs)
+    assert isinstance(vectorstore.as_retriever(), sharded.ShardedRetriever)
+    for q in questions:
+        assert _ranked(vectorstore.as_retriever(k=5).search_with_scores(q)) == flat[q]
+
+    # every chunk of a file lives in one shard, so re-ingesting is still an upsert
+    index_docs(docs)
+    # stats only cover shards a query has already opened
+    assert sharded.shard_stats() is None
+    vectorstore.as_retriever(k=5).search_with_scores(questions[0])
+    stats = sharded.shard_stats()
+    assert list(stats) == [DEFAULT_TENANT]
+    assert stats[DEFAULT_TENANT]["chunks_per_shard"] == summary["debug"]["sharding"]["chunks_per_shard"]
+    monkeypatch.setattr(settings, "chroma_shards", 5)
+    assert vectorstore.chroma_shard_count() == 3
+
+
+def test_shard_fan_out_matches_inline_search(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(vectorstore, "_embeddings", HashEmbeddings(dim=256))
+    monkeypatch.setattr(settings, "chroma_shards", 3)
+    docs = _corpus()
+    index_docs(docs)
+    query = vectorstore.get_embeddings().embed_query("overdue library fines")
+
+    monkeypatch.setattr(sharded, "_fan_out", lambda: False)
+    inline = sharded.sharded_search(query, 5)
+    monkeypatch.setattr(sharded, "_fan_out", lambda: True)
+    fanned = sharded.sharded_search(query, 5)
+    assert _ranked(fanned) == _ranked(inline)
+    assert {d.metadata["file"] for d, _ in fanned} == {"library.pdf"}
+    # documents and metadata come back as Chroma stores them, without its internal keys
+    texts = {d.page_content for d in docs}
+    assert all(d.page_content in texts and set(d.metadata) == {"file", "page"} for d, _ in fanned)
@@ -0,0 +1,94 @@
+import os
+import pytest
+from langchain_core.documents import Document
+from app import vectorstore
+from app.config import settings
+from app.rag.index import index_docs
+from app.tenancy import normalize_tenant, tenant_chroma_dir, tenant_pdfs_dir, tenant_scope
+
+
+def _ingest(tenant: str, words: str):
+    docs = [Document(page_content=f"{words} {i}", metadata={"file": f"{tenant}.pdf", "page": i}) for i in range(5)]
+    with tenant_scope(tenant):
+        assert index_docs(docs, backend="chroma")["status"] == "ok"
+
+
+def _files(tenant: str):
+    with tenant_scope(tenant):
+        return {d.metadata["file"] for d in vectorstore.as_retriever(k=5).invoke("policy")}
+
+
+def test_tenants_are_isolated(chroma_tmp):
+    _ingest("default", "default policy")
+    _ingest("acme", "acme policy")
+
+    assert _files("default") == {"default.pdf"}
+    assert _files("acme") == {"acme.pdf"}
+    assert _files("other") == set()
+    # the default tenant keeps the single-tenant layout
+    assert tenant_chroma_dir("default") == settings.chroma_persist_dir
+    assert tenant_pdfs_dir("acme") == os.path.join(settings.tenants_dir, "acme", "pdfs")
+    assert os.path.isdir(os.path.join(settings.tenants_dir, "acme", "chroma"))
+
+
+def test_least_recently_used_tenant_is_evicted(chroma_tmp, monkeypatch):
+    monkeypatch.setattr(settings, "tenant_cache_max", 2)
+    evicted = []
+    monkeypatch.setattr(vectorstore, "_eviction_hooks", [*vectorstore._eviction_hooks, evicted.append])
+    for tenant in ("t1", "t2"):
+        _ingest(tenant, f"{tenant} policy")
+    _files("t1")
+    _files("t2")
+    _files("t1")  # t2 is now the least recently used
+
+    _ingest("t3", "t3 policy")
+    _files("t3")
+    assert list(vectorstore._chroma_stores) == ["t1", "t3"]
+    assert "t2" in evicted
+    assert vectorstore.tenant_cache_stats()["max_open"] == 2
+
+    # an evicted tenant reopens from disk on its next request
+    assert _files("t2") == {"t2.pdf"}
+
+
+def test_eviction_waits_for_in_flight_queries(chroma_tmp):
+    _ingest("t1", "t1 policy")
+    with tenant_scope("t1"):
+        staging = vectorstore.new_chroma_version()
+        vectorstore.build_chroma_from_documents([Document(page_content="next", metadata={"file": "n.pdf", "page": 0})], version=staging)
+        staging_path = vectorstore.chroma_version_path(staging)
+        live_path = vectorstore.chroma_version_path()
+        store = vectorstore.get_chroma_vectorstore()
+        with vectorstore.chroma_lease():
+            vectorstore.evict_tenant("t1")
+            assert "t1" not in vectorstore._chroma_stores
+            # the query holding the lease can still use the store
+            assert store.similarity_search("policy", k=1)[0].metadata["file"] == "t1.pdf"
+            assert live_path in vectorstore._chroma_clients
+        # closed once the last user is done; the ingest's staging version is never touched
+        assert live_path not in vectorstore._chroma_clients
+        assert staging_path in vectorstore._chroma_clients
+    assert _files("t1") == {"t1.pdf"}
+
+
+def test_store_size_estimated_once_per_version(chroma_tmp):
+    _ingest("t1", "t1 policy")
+    _files("t1")
+    with tenant_scope("t1"):
+        path = vectorstore.chroma_version_path()
+    est = vectorstore._store_bytes[path]
+    assert est > vectorstore._TENANT_BASE_BYTES
+    vectorstore.evict_tenant("t1")
+    # reopening reuses the estimate instead of reading the collection again
+    assert vectorstore._estimate_store_bytes(path, collection=None) == est
+    # a write to the version invalidates it
+    _ingest("t1", "t1 more")
+    assert path not in vectorstore._store_bytes
+
+
+@pytest.mark.parametrize("bad", ["../etc", "Acme Corp", "a" * 49, "x/y"])
+def test_invalid_tenant_rejected(bad):
+    with pytest.raises(ValueError):
+        normalize_tenant(bad)
+    assert normalize_tenant(None) == "default"
+    assert normalize_tenant(" ACME ") == "acme"
@@ -0,0 +1,73 @@
+import os
+from langchain_core.documents import Document
+from app import vectorstore
+
+
+def _build(text: str) -> str:
+    version = vectorstore.new_chroma_version()
+    vectorstore.build_chroma_from_documents([Document(page_content=text, metadata={"file": "a.pdf", "page": 0})], version=version)
+    return version
+
+
+def test_blue_green_switch_and_gc(chroma_tmp):
+    v1 = _build("first")
+    vectorstore.publish_chroma_version(v1)
+    store = vectorstore.get_chroma_vectorstore()
+    assert store.similarity_search("first", k=1)[0].page_content == "first"
+
+    # a rebuild in progress does not affect readers
+    v2 = _build("second")
+    assert vectorstore.get_chroma_vectorstore() is store
+    vectorstore.publish_chroma_version(v2)
+    assert vectorstore.live_chroma_version() == v2
+    assert vectorstore.get_chroma_vectorstore().similarity_search("x", k=1)[0].page_content == "second"
+
+    v3 = _build("third")
+    vectorstore.publish_chroma_version(v3)
+    # live + one previous version are kept
+    assert not os.path.isdir(chroma_tmp / v1)
+    assert os.path.isdir(chroma_tmp / v2) and os.path.isdir(chroma_tmp / v3)
+
+
+def test_gc_waits_for_grace_period(chroma_tmp, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "chroma_gc_grace_s", 3600)
+    v1 = _build("first")
+    vectorstore.publish_chroma_version(v1)
+    vectorstore.publish_chroma_version(_build("second"))
+    vectorstore.publish_chroma_version(_build("third"))
+    # v1 is beyond CHROMA_KEEP_VERSIONS but was retired too recently
+    assert os.path.isdir(chroma_tmp / v1)
+    assert vectorstore.gc_chroma_versions(grace=0) == [v1]
+    assert not os.path.isdir(chroma_tmp / v1)
+
+
+def test_gc_removes_legacy_index(chroma_tmp):
+    # an index written straight into the persist dir before versioning
+    vectorstore.build_chroma_from_documents([Document(page_content="legacy", metadata={"file": "a.pdf", "page": 0})], version="")
+    assert os.path.exists(chroma_tmp / "chroma.sqlite3")
+    assert vectorstore.get_chroma_vectorstore().similarity_search("x", k=1)[0].page_content == "legacy"
+
+    v1 = _build("first")
+    vectorstore.publish_chroma_version(v1)
+    # live + the legacy index as its predecessor
+    assert os.path.exists(chroma_tmp / "chroma.sqlite3")
+    v2 = _build("second")
+    vectorstore.publish_chroma_version(v2)
+    assert sorted(os.listdir(chroma_tmp)) == sorted(["CURRENT", "CURRENT.lock", v1, v2])
+    assert vectorstore.get_chroma_vectorstore().similarity_search("x", k=1)[0].page_content == "second"
+
+
+def test_stale_publish_is_refused(chroma_tmp):
+    # two overlapping rebuilds: the one started first finishes last
+    older = _build("older")
+    newer = _build("newer")
+    assert vectorstore.publish_chroma_version(newer)
+    assert not vectorstore.publish_chroma_version(older)
+    assert vectorstore.live_chroma_version() == newer
+    assert vectorstore.get_chroma_vectorstore().similarity_search("x", k=1)[0].page_content == "newer"
+    # the refused version ranks below live, so GC collects it like any retired one
+    vectorstore.publish_chroma_version(_build("third"))
+    assert not os.path.isdir(chroma_tmp / older)
+    # republishing the live version is a no-op, not a stale publish
+    assert vectorstore.publish_chroma_version(vectorstore.live_chroma_version())
@@ -0,0 +1,117 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.config import settings
+from app.rag.weaviate_bulk import bulk_import_weaviate
+
+
+class _StandInWeaviate(BaseHTTPRequestHandler):
+    # Minimal Weaviate REST surface used by the v3 client batch path
+    stored = {}
+    attempts = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.startswith("/v1/meta"):
+            return self._reply(200, {"version": "1.24.0", "modules": {}})
+        if self.path.startswith("/v1/nodes"):
+            # an idle queue lets the client's dynamic batching scale the batch size up
+            stats = {"ratePerSecond": 500, "queueLength": 0}
+            return self._reply(200, {"nodes": [{"name": "stand-in", "stats": stats, "batchStats": stats}]})
+        return self._reply(404, {})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not self.path.startswith("/v1/batch/objects"):
+            return self._reply(404, {})
+        results = []
+        for obj in body["objects"]:
+            text = obj["properties"]["text"]
+            with self.lock:
+                n = self.attempts[obj["id"]] = self.attempts.get(obj["id"], 0) + 1
+                # "flaky" objects fail once, "broken" ones always fail
+                failed = "broken" in text or ("flaky" in text and n == 1)
+                if not failed:
+                    self.stored[obj["id"]] = obj
+            result = {"errors": {"error": [{"message": "injected failure"}]}} if failed else {}
+            results.append({**obj, "result": result})
+        return self._reply(200, results)
+
+
+@pytest.fixture
+def weaviate_stub(monkeypatch):
+    _StandInWeaviate.stored = {}
+    _StandInWeaviate.attempts = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInWeaviate)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(settings, "weaviate_host", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(settings, "weaviate_api_key", "test-key")
+    monkeypatch.setattr(settings, "weaviate_batch_size", 8)
+    monkeypatch.setattr(settings, "weaviate_batch_workers", 3)
+    yield _StandInWeaviate
+    server.shutdown()
+
+
+def test_bulk_import_retries_and_collects_errors(weaviate_stub):
+    texts = [f"chunk {i}" for i in range(40)] + ["flaky chunk", "broken chunk"]
+    chunks = [Document(page_content=t, metadata={"file": "a.pdf", "page": i}) for i, t in enumerate(texts)]
+    stats = bulk_import_weaviate(chunks, class_name="UniversityDocTest", embeddings=DeterministicFakeEmbedding(size=8))
+
+    assert stats["objects"] == 42
+    assert stats["imported"] == 41 and stats["failed"] == 1
+    assert stats["errors"][0]["page"] == 41
+    assert stats["objects_per_sec"] > 0
+    assert len(weaviate_stub.stored) == 41
+    stored = next(o for o in weaviate_stub.stored.values() if o["properties"]["text"] == "flaky chunk")
+    assert stored["class"] == "UniversityDocTest" and len(stored["vector"]) == 8
+
+
+def test_bulk_import_uses_chunk_ids(weaviate_stub):
+    from app.rag.index import chunk_ids
+
+    # a repeated chunk on the same page is kept twice, as in Chroma
+    chunks = [Document(page_content="same text", metadata={"file": "a.pdf", "page": 1}) for _ in range(2)]
+    stats = bulk_import_weaviate(chunks, class_name="UniversityDocTest", embeddings=DeterministicFakeEmbedding(size=8))
+    assert stats["objects"] == 2 and stats["imported"] == 2
+    assert set(weaviate_stub.stored) == set(chunk_ids(chunks))
+
+
+def test_failed_object_counted_once():
+    from types import SimpleNamespace
+
+    class Batch:
+        def configure(self, callback=None, **kwargs):
+            self.callback = callback
+
+        def __enter__(self):
+            self.ids = []
+            return self
+
+        def add_data_object(self, props, class_name, uuid=None, vector=None):
+            self.ids.append(uuid)
+
+        def __exit__(self, *exc):
+            # the same object reported as failed by two server batches (retried once)
+            failed = [{"id": self.ids[0], "result": {"errors": {"error": [{"message": "boom"}]}}}]
+            self.callback(failed)
+            self.callback(failed)
+
+    chunks = [Document(page_content=f"chunk {i}", metadata={"file": "a.pdf", "page": i}) for i in range(5)]
+    stats = bulk_import_weaviate(chunks, client=SimpleNamespace(batch=Batch()), class_name="C", embeddings=DeterministicFakeEmbedding(size=8))
+    assert stats["objects"] == 5
+    assert stats["failed"] == 1 and stats["imported"] == 4 and len(stats["errors"]) == 1
@@ -0,0 +1,48 @@
+import asyncio
+from app.api.ws import batched_tokens
+
+
+async def _source(script):
+    # (delay before the event, event)
+    for delay, event in script:
+        await asyncio.sleep(delay)
+        yield event
+
+
+def _tok(text):
+    return {"type": "token", "text": text}
+
+
+def _collect(script, max_bytes, window):
+    async def run():
+        return [e async for e in batched_tokens(_source(script), max_bytes, window)]
+    return asyncio.run(run())
+
+
+def test_tokens_flush_on_time_window():
+    script = [(0, _tok("a")), (0, _tok("b")), (0.15, _tok("c")), (0, {"type": "done"})]
+    assert _collect(script, max_bytes=0, window=0.05) == [_tok("ab"), _tok("c"), {"type": "done"}]
+
+
+def test_tokens_flush_on_size_and_before_other_events():
+    script = [(0, _tok("abc")), (0, _tok("def")), (0, _tok("g")), (0, {"type": "citations", "text": "[1]"})]
+    assert _collect(script, max_bytes=5, window=10) == [_tok("abcdef"), _tok("g"), {"type": "citations", "text": "[1]"}]
+
+
+def test_stalled_source_is_flushed_without_waiting():
+    # the buffered token goes out after the window even though the next event is still pending
+    async def run():
+        out = []
+        start = asyncio.get_running_loop().time()
+        async for event in batched_tokens(_source([(0, _tok("x")), (0.5, {"type": "done"})]), 1024, 0.05):
+            out.append((event, asyncio.get_running_loop().time() - start))
+        return out
+
+    out = asyncio.run(run())
+    assert out[0][0] == _tok("x") and out[0][1] < 0.3
+    assert out[1][0] == {"type": "done"}
+
+
+def test_disabled_passes_events_through():
+    script = [(0, _tok("a")), (0, _tok("b"))]
+    assert _collect(script, max_bytes=0, window=0) == [_tok("a"), _tok("b")]